@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Regression check of the default output: fix() is run on a copy of testfiles/ and
+the csv and "_fixed.rdf" of each file are compared against the MD5 sums of the
+original (pre-optimization) output, stored in testfiles_baseline.md5.
+Any change of a byte of the default output shows up here.
+
+Usage (from the repository root):
+python benchmarks/check_testfiles.py
+exits with 1 if an output differs from the baseline or is missing.
+python benchmarks/check_testfiles.py --update
+rewrites the baseline, only for an intended change of the default output.
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import argparse
+import hashlib
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY))
+
+from rdfmodule import rdf_fixer  # noqa: E402
+
+TESTFILES = REPOSITORY / "testfiles"
+DEFAULT_BASELINE = str(Path(__file__).resolve().parent / "testfiles_baseline.md5")
+
+
+def md5_of_file(file_name: Path) -> str:
+    md5 = hashlib.md5()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def read_baseline(baseline_file: str) -> Dict[str, str]:
+    """file name -> MD5 sum, from a file in md5sum format."""
+    baseline = {}
+    with open(baseline_file) as f:
+        for line in f:
+            if line.strip():
+                md5, file_name = line.split(maxsplit=1)
+                baseline[file_name.strip()] = md5
+    return baseline
+
+
+def outputs_of_testfiles() -> Dict[str, str]:
+    """Runs fix() with the defaults on a copy of testfiles/;
+    the MD5 sum of each csv and "_fixed.rdf" file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rdf_file in sorted(TESTFILES.glob("*.rdf")):
+            shutil.copy(rdf_file, tmp_dir)
+        rdf_fixer.fix(tmp_dir)
+        outputs = sorted(Path(tmp_dir).glob("*.csv"))
+        outputs += sorted(Path(tmp_dir).glob("*_fixed.rdf"))
+        return {output.name: md5_of_file(output) for output in outputs}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the default output on testfiles/ against the baseline."
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="rewrite the baseline with the current output",
+    )
+    args = parser.parse_args()
+
+    outputs = outputs_of_testfiles()
+    if args.update:
+        with open(args.baseline, "w") as f:
+            for file_name in sorted(outputs):
+                f.write(f"{outputs[file_name]}  {file_name}\n")
+        print(f"Baseline written: {args.baseline} ({len(outputs)} files)")
+        return 0
+
+    baseline = read_baseline(args.baseline)
+    failed = 0
+    for file_name, md5 in sorted(baseline.items()):
+        if file_name not in outputs:
+            print(f"MISSING  {file_name}")
+            failed += 1
+        elif outputs[file_name] != md5:
+            print(f"DIFFERS  {file_name}")
+            failed += 1
+        else:
+            print(f"OK       {file_name}")
+    for file_name in sorted(set(outputs) - set(baseline)):
+        print(f"NEW      {file_name} (not in the baseline)")
+
+    print(f"{len(baseline) - failed} of {len(baseline)} outputs as in the baseline.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic large RDF files for benchmarking, built from the exports in testfiles/.
+The entries of a template are repeated in random (seeded) order with new IDs,
+a fraction of them without molecule block (as the fixer has to remove them).
+Optionally, the first multiline field of each entry (procedure, title...) is made
+very long, for the parsing of long procedures (see long_fields.py).
+
+Usage:
+generate_rdf.py testfiles/reaxys_export.rdf /tmp/reaxys_large.rdf 100000
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import random
+import sys
+from typing import List, Tuple
+
+# $DTYPE tags of multiline fields, in order of preference for lengthening
+MULTILINE_KEYS = ("EXP_PROC", "TXT", "NOTES", "TITLE", "AUTHOR", "CITATION")
+# a procedure line, ending none of the multiline fields
+FILLER_LINE = (
+    "The mixture was stirred at room temperature for 2 h, "
+    "then filtered and concentrated under reduced pressure.\n"
+)
+
+TEMPLATES = {
+    "scifinder": "scifinder_export.rdf",
+    "reaxys": "reaxys_export.rdf",
+    "icsynth": "icsynth_export.rdf",
+    "spresi": "spresi_export.rdf",
+}
+
+
+def read_template(template_file: str) -> Tuple[List[str], List[List[str]]]:
+    """Splits an RDF file into its header ($RDFILE, $DATM) and its $RFMT entries."""
+    header: List[str] = []
+    entries: List[List[str]] = []
+    with open(template_file, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("$RFMT"):
+                entries.append([line])
+            elif entries:
+                entries[-1].append(line)
+            else:
+                header.append(line)
+    if entries and not entries[-1][-1].endswith("\n"):
+        entries[-1][-1] += "\n"
+
+    return header, entries
+
+
+def _renamed(rfmt_line: str, copy: int) -> str:
+    """The $RFMT line with the ID of the n-th copy; bare lines (Spresi) stay bare."""
+    parts = rfmt_line.rstrip("\n").split(" ")
+    if len(parts) < 3:
+        return rfmt_line
+    return f"{parts[0]} {parts[1]} {parts[2]}-{copy}\n"
+
+
+def _without_molecules(entry: List[str]) -> List[str]:
+    """The entry with its molecule block removed: $RFMT directly followed by $DTYPE."""
+    for i, line in enumerate(entry):
+        if line.startswith("$DTYPE"):
+            return [entry[0]] + entry[i:]
+    return entry
+
+
+def _with_long_field(entry: List[str], field_lines: int) -> List[str]:
+    """The entry with field_lines more lines in its first multiline field (if any).
+    Only fields followed by another one, as the last one of an entry is never ended.
+    """
+    last_field = max(
+        (i for i, line in enumerate(entry) if line.startswith("$DTYPE")), default=0
+    )
+    for key in MULTILINE_KEYS:
+        for i, line in enumerate(entry[:last_field]):
+            if line.startswith("$DTYPE") and key in line:
+                if i + 1 < len(entry) and entry[i + 1].startswith("$DATUM"):
+                    i += 1
+                return entry[: i + 1] + [FILLER_LINE] * field_lines + entry[i + 1 :]
+    return entry
+
+
+def generate_rdf(
+    template_file: str,
+    out_file: str,
+    number_reactions: int,
+    empty_fraction: float = 0.01,
+    seed: int = 0,
+    field_lines: int = 0,
+) -> int:
+    """Writes an RDF file of the given number of entries, varied from a template.
+
+    Args:
+        template_file: one of the testfiles (or any other RDF export)
+        out_file: the synthetic RDF file
+        number_reactions: number of $RFMT entries to write
+        empty_fraction: share of entries written without molecule block
+        seed: for the order of the entries, same seed gives the same file
+        field_lines: extra lines in the first multiline field of each entry
+    Returns:
+        size of the written file in bytes.
+    """
+
+    header, entries = read_template(template_file)
+    if not entries:
+        raise ValueError(f"No $RFMT entries in {template_file}")
+
+    randomizer = random.Random(seed)
+    size = 0
+    with open(out_file, "w", encoding="utf-8", newline="\n") as f:
+        size += f.write("".join(header))
+        order = list(range(len(entries)))
+        written = 0
+        copy = 0
+        while written < number_reactions:
+            randomizer.shuffle(order)
+            for i in order[: number_reactions - written]:
+                entry = entries[i]
+                if randomizer.random() < empty_fraction:
+                    entry = _without_molecules(entry)
+                if field_lines:
+                    entry = _with_long_field(entry, field_lines)
+                size += f.write(_renamed(entry[0], copy) + "".join(entry[1:]))
+                written += 1
+            copy += 1
+
+    return size
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: generate_rdf.py template.rdf out.rdf number_reactions [seed]")
+        sys.exit(1)
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    size = generate_rdf(sys.argv[1], sys.argv[2], int(sys.argv[3]), seed=seed)
+    print(f"Written {sys.argv[2]}: {size / 1e6:.1f} MB")
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Regression benchmark for very long multiline fields (procedures, notes, titles...).
+Synthetic RDF files with growing procedures are parsed via mmap (read_records, on
+the fixed file), the way fix() does it (fixed_blocks + parse_blocks, on the
+original) and as text (parse_records, as read_records does for compressed files).
+The throughput (MB/s) has to stay about the same whatever the field length, i.e. the
+parsing stays linear;
+string concatenation line by line would drop it with every longer field.
+
+Usage (from the repository root):
+python benchmarks/long_fields.py
+python benchmarks/long_fields.py --vendors reaxys --field-lines 1000 100000
+exits with 1 if the longest fields are parsed more than --max-slowdown (default 3)
+times slower per MB than the shortest ones.
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Tuple
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY))
+
+from generate_rdf import FILLER_LINE, TEMPLATES, generate_rdf  # noqa: E402
+
+from rdfmodule.rdf_parser import (  # noqa: E402
+    RdfRecord,
+    detect_file_type,
+    fixed_blocks,
+    open_text,
+    parse_blocks,
+    parse_records,
+    read_records,
+)
+
+# parser name -> (parser, on the fixed file)
+PARSERS: Dict[str, Tuple[Callable[[str], Iterable[RdfRecord]], bool]] = {
+    "mmap": (read_records, True),
+    "fix": (
+        lambda rdf_file: parse_blocks(
+            fixed_blocks(rdf_file), detect_file_type(rdf_file)
+        ),
+        False,
+    ),
+    "text": (
+        lambda rdf_file: parse_records(open_text(rdf_file), detect_file_type(rdf_file)),
+        True,
+    ),
+}
+
+
+def longest_value(records: Iterable[RdfRecord]) -> int:
+    """Length of the longest field value (all records are parsed)."""
+    return max(
+        (len(value) for record in records for value in record.fields.values()),
+        default=0,
+    )
+
+
+def run_case(rdf_file: str, parser: str, repeat: int) -> Dict:
+    """Best of repeat parses of a file."""
+    parse, on_fixed = PARSERS[parser]
+    if on_fixed:
+        rdf_file = rdf_file.replace(".rdf", "_fixed.rdf")
+    best = None
+    longest = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        longest = longest_value(parse(rdf_file))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    megabytes = os.path.getsize(rdf_file) / 1e6
+    return {
+        "megabytes": megabytes,
+        "seconds": best,
+        "mb_per_s": megabytes / best,
+        "longest": longest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="long multiline fields benchmark")
+    parser.add_argument("--vendors", nargs="+", default=["reaxys", "scifinder"])
+    parser.add_argument(
+        "--field-lines", nargs="+", type=int, default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--reactions", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-slowdown", type=float, default=3.0)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as work_dir:
+        for vendor in args.vendors:
+            template = str(REPOSITORY / "testfiles" / TEMPLATES[vendor])
+            rates: Dict[str, Dict[int, float]] = {name: {} for name in PARSERS}
+            for field_lines in args.field_lines:
+                rdf_file = os.path.join(work_dir, f"{vendor}-{field_lines}.rdf")
+                generate_rdf(
+                    template,
+                    rdf_file,
+                    args.reactions,
+                    empty_fraction=0.0,
+                    field_lines=field_lines,
+                )
+                with open(rdf_file.replace(".rdf", "_fixed.rdf"), "wb") as f:
+                    f.writelines(fixed_blocks(rdf_file))
+                for name in PARSERS:
+                    result = run_case(rdf_file, name, args.repeat)
+                    rates[name][field_lines] = result["mb_per_s"]
+                    print(
+                        f"{vendor:<10}{field_lines:>8} lines {name:<5}"
+                        f"{result['megabytes']:>8.1f} MB {result['seconds']:>8.2f}s"
+                        f"{result['mb_per_s']:>8.1f} MB/s"
+                    )
+                    if result["longest"] < field_lines * (len(FILLER_LINE) - 1):
+                        ok = False
+                        print("  long field not parsed as one value")
+            for name, rate in rates.items():
+                shortest = rate[min(rate)]
+                longest = rate[max(rate)]
+                if longest * args.max_slowdown < shortest:
+                    ok = False
+                    print(
+                        f"  {vendor} {name}: {shortest / longest:.1f}x slower per MB "
+                        f"with {max(rate)} than with {min(rate)} lines"
+                    )
+
+    if not ok:
+        sys.exit(1)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
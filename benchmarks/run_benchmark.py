@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of fix() and its stages on synthetic RDF files (see generate_rdf.py).
+Reports reactions/s, MB/s, peak RSS and the time per stage, saves the results
+as JSON and compares them against a stored baseline.
+
+Usage (from the repository root):
+python benchmarks/run_benchmark.py --sizes 1000 10000 --out results.json
+python benchmarks/run_benchmark.py --save-baseline
+python benchmarks/run_benchmark.py --baseline benchmarks/baseline.json
+the latter exits with 1 if throughput or peak RSS of a case got worse
+than the tolerance (default 10%).
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+REPOSITORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY))
+
+from generate_rdf import TEMPLATES, generate_rdf  # noqa: E402
+
+DEFAULT_BASELINE = str(Path(__file__).resolve().parent / "baseline.json")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB, None where not available."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _run_total(rdf_file: str, chunk_size: Optional[int]) -> Dict:
+    """fix() end to end; runs in a fresh process, so the peak RSS is its own."""
+    from rdfmodule import rdf_fixer
+
+    start = time.perf_counter()
+    rdf_fixer.fix(rdf_file, chunk_size=chunk_size)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def _run_stages(rdf_file: str, work_dir: str, chunk_size: Optional[int]) -> Dict:
+    """The stages of fix() one after the other, each timed on its own."""
+    from rdfmodule import rdf_fixer
+    from rdfmodule.rdf_parser import (
+        detect_file_type,
+        fixed_blocks,
+        read_records,
+        scan_schema_blocks,
+    )
+
+    rdf_file_ok = os.path.join(work_dir, "stages_fixed.rdf")
+    rdf_file_csv = os.path.join(work_dir, "stages.csv")
+    stages = {}
+
+    start = time.perf_counter()
+    with open(rdf_file_ok, "wb") as f:
+        f.writelines(fixed_blocks(rdf_file))
+    stages["fix"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_schema_blocks(fixed_blocks(rdf_file), detect_file_type(rdf_file))
+    stages["schema"] = time.perf_counter() - start
+
+    reactions = 0
+    molecules = 0
+    start = time.perf_counter()
+    for record in read_records(rdf_file_ok):
+        reactions += 1
+        molecules += len(record.molecules)
+    stages["parse"] = time.perf_counter() - start
+
+    # the SMILES of all molecules, in batches (not counting the parsing again)
+    stages["smiles"] = 0.0
+    batch = []
+    for record in read_records(rdf_file_ok):
+        batch += record.molecules
+        if len(batch) >= rdf_fixer.SMILES_CHUNK_SIZE:
+            start = time.perf_counter()
+            rdf_fixer.smiles_from_molblocks(batch)
+            stages["smiles"] += time.perf_counter() - start
+            batch = []
+    start = time.perf_counter()
+    rdf_fixer.smiles_from_molblocks(batch)
+    stages["smiles"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    rdf_fixer.csv_from_rdf(rdf_file_ok, rdf_file_csv, chunk_size=chunk_size)
+    stages["convert"] = time.perf_counter() - start
+    # convert = parse + smiles + building and writing the table
+    stages["write"] = max(0.0, stages["convert"] - stages["parse"] - stages["smiles"])
+
+    return {"stages": stages, "reactions": reactions, "molecules": molecules}
+
+
+def _in_fresh_process(function, *args):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, *args).result()
+
+
+def run_case(
+    vendor: str,
+    number_reactions: int,
+    work_dir: str,
+    chunk_size: Optional[int],
+    repeat: int = 1,
+    seed: int = 0,
+) -> Dict:
+    """Generates the RDF file of a case and measures it; the best of repeats counts."""
+    case_dir = os.path.join(work_dir, f"{vendor}-{number_reactions}")
+    os.makedirs(case_dir, exist_ok=True)
+    rdf_file = os.path.join(case_dir, f"{vendor}.rdf")
+    template = str(REPOSITORY / "testfiles" / TEMPLATES[vendor])
+    size = generate_rdf(template, rdf_file, number_reactions, seed=seed)
+
+    totals = []
+    stage_runs = []
+    for _ in range(repeat):
+        for output in os.listdir(case_dir):
+            if output != f"{vendor}.rdf":
+                os.remove(os.path.join(case_dir, output))
+        totals.append(_in_fresh_process(_run_total, rdf_file, chunk_size))
+        stage_runs.append(
+            _in_fresh_process(_run_stages, rdf_file, case_dir, chunk_size)
+        )
+
+    seconds = min(total["seconds"] for total in totals)
+    peaks = [total["peak_rss_mb"] for total in totals]
+    reactions = stage_runs[0]["reactions"]
+    return {
+        "reactions": reactions,
+        "molecules": stage_runs[0]["molecules"],
+        "megabytes": size / 1e6,
+        "seconds": seconds,
+        "reactions_per_s": reactions / seconds,
+        "mb_per_s": size / 1e6 / seconds,
+        "peak_rss_mb": None if None in peaks else min(peaks),
+        "stages": {
+            stage: min(run["stages"][stage] for run in stage_runs)
+            for stage in stage_runs[0]["stages"]
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Prints the change per case against the baseline.
+
+    Returns:
+        True if no case got slower (reactions/s) or bigger (peak RSS) than the tolerance.
+    """
+    ok = True
+    print(
+        f"\n{'case':<22}{'reactions/s':>14}{'change':>9}{'peak RSS MB':>14}{'change':>9}"
+    )
+    for case, current in results["cases"].items():
+        before = baseline["cases"].get(case)
+        if before is None:
+            print(f"{case:<22}{current['reactions_per_s']:>14.0f}{'new':>9}")
+            continue
+        speed = current["reactions_per_s"] / before["reactions_per_s"] - 1
+        line = f"{case:<22}{current['reactions_per_s']:>14.0f}{speed:>+9.1%}"
+        flags = ""
+        if speed < -tolerance:
+            ok = False
+            flags += "  SLOWER"
+        if current["peak_rss_mb"] and before["peak_rss_mb"]:
+            memory = current["peak_rss_mb"] / before["peak_rss_mb"] - 1
+            line += f"{current['peak_rss_mb']:>14.0f}{memory:>+9.1%}"
+            if memory > tolerance:
+                ok = False
+                flags += "  MORE MEMORY"
+        line += flags
+        print(line)
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rdf_fixer benchmark")
+    parser.add_argument("--vendors", nargs="+", default=list(TEMPLATES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="chunk_size for fix(); 0 for one table (slow for large files)",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="default: a temporary directory")
+    parser.add_argument("--out", help="results as JSON")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help=f"store the results as baseline ({DEFAULT_BASELINE})",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    chunk_size = args.chunk_size or None
+    results = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "chunk_size": chunk_size,
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        for vendor in args.vendors:
+            for number_reactions in args.sizes:
+                case = f"{vendor}-{number_reactions}"
+                print("Benchmarking: ", case)
+                result = run_case(
+                    vendor,
+                    number_reactions,
+                    work_dir,
+                    chunk_size,
+                    repeat=args.repeat,
+                    seed=args.seed,
+                )
+                results["cases"][case] = result
+                stages = ", ".join(
+                    f"{stage} {seconds:.2f}s"
+                    for stage, seconds in result["stages"].items()
+                )
+                print(
+                    f"  {result['reactions_per_s']:.0f} reactions/s, "
+                    f"{result['mb_per_s']:.1f} MB/s, "
+                    f"peak RSS {result['peak_rss_mb'] or 0:.0f} MB ({stages})"
+                )
+
+    for out_file in (args.out, DEFAULT_BASELINE if args.save_baseline else None):
+        if out_file:
+            with open(out_file, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=1)
+            print("Results written to: ", out_file)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("chunk_size") != chunk_size:
+            print("Note: baseline was measured with chunk_size", baseline["chunk_size"])
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
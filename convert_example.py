@@ -29,10 +29,12 @@ def main():
     Usage:
     convert_example.py /home/user/my_rdf_file.rdf True/False
     or
-    convert_example.py /home/user/subdir/
+    convert_example.py /home/user/subdir/ --workers 8
     the flag True/False is optional;
     default is True and will do both, fix and convert
     False will only fix the file(s), not create csv file.
+    --workers handles the files in parallel processes (default 1).
+    The installed command "rdf-fixer" offers more options (see rdf-fixer --help).
     """
 
     try:
@@ -42,10 +44,14 @@ def main():
         sys.exit(1)
     # argparse would be an alternative. check the jupyter book for an example
 
+    workers = 1
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    convert_to_csv = "False" not in sys.argv[2:]
+
     print("Initiating conversion...")
-    rdf_fixer.fix(sys.argv[1])
-    # or below example without csv creation
-    rdf_fixer.fix(sys.argv[1], False)
+    rdf_fixer.fix(sys.argv[1], convert_to_csv, workers=workers)
+    # with False as second argument: no csv creation, only fixing
     print("And done.")
 
     return None
@@ -8,6 +8,9 @@ Example usage:
     from rdfmodule import rdf_fixer
     rdf_fixer.fix('input.rdf', flag=True)
 
+    from rdfmodule.reactions import read_reactions
+    for reaction in read_reactions('input.rdf', smiles=True): ...
+
 Main contributors:
 - Alexander Minidis (alexander.minidis@gmail.com)
 
@@ -15,6 +18,6 @@ This package was initially developed at RISE Södertälje, Sweden, later maintai
 
 """
 
-__version__ = "3.0.9"
+__version__ = "3.1.1"
 __author__ = "Alexander Minidis | DocMinus"
 __credits__ = "RISE Södertälje, Sweden"
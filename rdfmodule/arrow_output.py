@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar output (Apache Parquet or Arrow IPC/Feather) of the converted table.
+Written in row groups, one per batch of reactions.
+Yield, temperature and time fields get an additional numeric column ("<column>_num"),
+filled where the text parses as a number.
+
+Needs pyarrow (optional): pip install rdf_fixer[parquet]
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import re
+from typing import Dict, List, Optional
+
+# all output formats of fix(), sqlite see sqlite_output.py, long see long_output.py
+OUTPUT_FORMATS = ("csv", "parquet", "feather", "sqlite", "long")
+FILE_EXTENSIONS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "sqlite": ".sqlite",
+    "long": ".csv",
+}
+
+# last part of a tag: Scifinder/ICSynth/Spresi YIELD, Reaxys YD/NYD, T and TIM
+NUMERIC_TAGS = {"YIELD", "YD", "NYD", "T", "TIM", "TEMP", "TEMPERATURE", "TIME"}
+# e.g. "94", "94 percent", "0.5", "-78", "86%"; ranges or "97 percent ee" don't parse
+PATTERN_NUMBER = re.compile(r"\s*([-+]?\d+(?:\.\d+)?)\s*(?:%|percent)?\s*$")
+
+
+def numeric_columns(columns: List[str]) -> List[str]:
+    """Columns holding yields, temperatures or times."""
+    return [c for c in columns if c.split(":")[-1].upper() in NUMERIC_TAGS]
+
+
+def numeric_value(text: Optional[str]) -> Optional[float]:
+    """The number in a field value, None if it doesn't parse."""
+    if text is None:
+        return None
+    found = PATTERN_NUMBER.match(text)
+    if found is None:
+        return None
+    return float(found.group(1))
+
+
+class ArrowTableWriter:
+    """
+    Writes batches of table rows to a Parquet or Feather file with a fixed schema:
+    "rxn_id", then the columns as strings (missing values are null),
+    then the numeric "<column>_num" columns as float64.
+    """
+
+    def __init__(self, out_file: str, columns: List[str], output_format: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError as _e:
+            raise ImportError(
+                f"{output_format} output needs pyarrow: pip install pyarrow"
+            ) from _e
+
+        self._pa = pa
+        self.columns = columns
+        self.numeric = numeric_columns(columns)
+        fields = [pa.field("rxn_id", pa.string())]
+        fields += [pa.field(c, pa.string()) for c in columns]
+        fields += [pa.field(c + "_num", pa.float64()) for c in self.numeric]
+        self.schema = pa.schema(fields)
+
+        if output_format == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(out_file, self.schema)
+        elif output_format == "feather":
+            self._writer = pyarrow.ipc.new_file(out_file, self.schema)
+        else:
+            raise ValueError(f"Unknown columnar output format: {output_format}")
+
+    def write(self, ids: List[str], rows: List[Dict[str, str]]) -> None:
+        """Writes one batch (row group)."""
+        pa = self._pa
+        arrays = [pa.array(ids, pa.string())]
+        arrays += [
+            pa.array([row.get(c) for row in rows], pa.string()) for c in self.columns
+        ]
+        arrays += [
+            pa.array([numeric_value(row.get(c)) for row in rows], pa.float64())
+            for c in self.numeric
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
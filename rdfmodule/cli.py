@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Command line entry point, installed as "rdf-fixer".
+Only rdf_fixer (or rdf_stats) is imported here; pandas and RDKit are loaded once
+a conversion needs them, so fix-only runs, dry runs and --stats start quickly.
+
+Usage:
+rdf-fixer /home/user/my_rdf_file.rdf
+rdf-fixer /home/user/subdir/ --workers 8 --format parquet
+rdf-fixer /home/user/subdir/ --identifiers --chunk-size 10000
+rdf-fixer /home/user/subdir/ --fix-only --incremental --dry-run
+rdf-fixer /home/user/subdir/ --format sqlite --database reactions.sqlite
+rdf-fixer /home/user/subdir/ --stats --workers 8
+rdf-fixer /home/user/subdir/ --merge all_reactions.csv.gz
+rdf-fixer /home/user/huge.rdf --parts 16
+rdf-fixer /home/user/huge.rdf --split 64
+rdf-fixer /home/user/huge_parts/huge.split.json --join
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+from typing import List, Optional
+
+from rdfmodule import __version__
+from rdfmodule.arrow_output import OUTPUT_FORMATS
+from rdfmodule.molecules import SMILES_PROFILES
+from rdfmodule.rdf_parser import COMPRESSED_EXTENSIONS, strip_compression
+
+COMPRESSIONS = tuple(extension.lstrip(".") for extension in COMPRESSED_EXTENSIONS)
+
+
+def parse_arguments(arguments: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="rdf-fixer",
+        description="Fixes RDF files (Reaxys, SciFinder, ICSynth, Spresi...) "
+        "and converts them to csv, Parquet, Feather, SQLite or long tables.",
+    )
+    parser.add_argument("sources", nargs="+", help="RDF file(s) or directories")
+    parser.add_argument(
+        "--fix-only", action="store_true", help="only write the _fixed.rdf files"
+    )
+    parser.add_argument(
+        "--no-fixed",
+        action="store_true",
+        help="convert only, don't write the _fixed.rdf files",
+    )
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument(
+        "--database",
+        help="SQLite file to load all files into (--format sqlite), "
+        "default one per file",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="files processed in parallel"
+    )
+    parser.add_argument(
+        "--smiles-workers", type=int, default=1, help="processes for the SMILES"
+    )
+    parser.add_argument("--smiles-profile", choices=SMILES_PROFILES, default="full")
+    parser.add_argument(
+        "--identifiers",
+        action="store_true",
+        help="add InChIKeys, reaction SMILES and a reaction hash to the table",
+    )
+    parser.add_argument("--chunk-size", type=int, help="reactions per batch")
+    parser.add_argument("--cache-size", type=int, default=0, help="SMILES cache")
+    parser.add_argument("--cache-file", help="SQLite file for the SMILES cache")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compressed outputs")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only new or changed files (manifest in the directory)",
+    )
+    parser.add_argument("--metrics-log", help="appends JSON metrics per file")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="list the files that would be processed, write nothing",
+    )
+    parser.add_argument(
+        "--merge",
+        metavar="OUT_FILE",
+        help="convert all files into this one table (union of the columns, "
+        "source_file column, reaction IDs seen before in the same source left out)",
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="with --merge: keep reaction IDs seen before",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="only scan the files, print their statistics as JSON (see rdf_stats)",
+    )
+    parser.add_argument(
+        "--parts",
+        type=int,
+        help="process each file in this many shards in parallel (see rdf_split)",
+    )
+    parser.add_argument(
+        "--split",
+        type=int,
+        metavar="N",
+        help="only split each file into N shards (+ manifest) in <name>_parts",
+    )
+    parser.add_argument(
+        "--split-size",
+        type=float,
+        metavar="MB",
+        help="only split each file into shards of about this size",
+    )
+    parser.add_argument(
+        "--join",
+        action="store_true",
+        help="sources are split manifests: join the outputs of their shards",
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+    return parser.parse_args(arguments)
+
+
+def invalid_source(rdf_source: str, manifest=False, single_file=False) -> Optional[str]:
+    """The error text if a source is neither a directory nor an RDF file
+    (a split manifest with manifest=True, only an RDF file with single_file),
+    else None."""
+    if manifest:
+        if not os.path.isfile(rdf_source):
+            return f"Split manifest not found: {rdf_source}"
+        return None
+    if os.path.isdir(rdf_source):
+        if single_file:
+            return f"--parts/--split take RDF files, not a directory: {rdf_source}"
+        return None
+    if not os.path.exists(rdf_source):
+        return f"No such file or directory: {rdf_source}"
+    if not (
+        os.path.isfile(rdf_source)
+        and strip_compression(rdf_source).endswith(("rdf", "RDF"))
+    ):
+        return f"Neither an RDF file nor a directory: {rdf_source}"
+    return None
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    args = parse_arguments(arguments)
+    if args.fix_only and args.no_fixed:
+        print("--fix-only and --no-fixed together leave nothing to do.")
+        return 2
+    if args.parts and (args.dry_run or args.incremental):
+        print("--parts can't be combined with --dry-run or --incremental.")
+        return 2
+    if args.parts and args.format == "sqlite" and not args.database:
+        print("--parts with --format sqlite needs one --database for all shards.")
+        return 2
+    if args.merge and args.format == "sqlite":
+        print("For one database of all files, use --format sqlite --database.")
+        return 2
+    if args.identifiers and args.format in ("sqlite", "long"):
+        print("--identifiers are table columns, use --format csv, parquet or feather.")
+        return 2
+    if args.merge and args.format == "long":
+        print("--merge writes one wide table, use --format csv, parquet or feather.")
+        return 2
+    if args.merge:
+        # options of the per file runs, merge() has none of them
+        per_file = {
+            "--fix-only": args.fix_only,
+            "--no-fixed": args.no_fixed,
+            "--database": args.database,
+            "--identifiers": args.identifiers,
+            "--compress": args.compress,
+            "--incremental": args.incremental,
+            "--metrics-log": args.metrics_log,
+            "--stats": args.stats,
+            "--parts": args.parts,
+            "--split": args.split,
+            "--split-size": args.split_size,
+            "--join": args.join,
+        }
+        given = [option for option, value in per_file.items() if value]
+        if given:
+            print(
+                f"--merge can't be combined with {', '.join(given)} "
+                "(compress via the name of OUT_FILE, e.g. all.csv.gz)."
+            )
+            return 2
+    single_file = bool(args.parts or args.split or args.split_size)
+    errors = [
+        invalid_source(rdf_source, args.join, single_file)
+        for rdf_source in args.sources
+    ]
+    errors = [error for error in errors if error is not None]
+    if errors:
+        print("\n".join(errors))
+        return 2
+
+    if args.stats:
+        from rdfmodule import rdf_stats
+
+        all_stats = []
+        for rdf_source in args.sources:
+            all_stats += rdf_stats.scan(rdf_source, workers=args.workers)
+        print(json.dumps([stats.as_dict() for stats in all_stats], indent=1))
+        return 1 if any(stats.error for stats in all_stats) else 0
+
+    if args.split or args.split_size or args.join:
+        from rdfmodule import rdf_split
+
+        failed = 0
+        for rdf_source in args.sources:
+            try:
+                if args.join:
+                    rdf_split.join_outputs(
+                        rdf_source,
+                        output_format=args.format,
+                        compress_output=args.compress,
+                    )
+                else:
+                    target_size = (
+                        int(args.split_size * 1e6) if args.split_size else None
+                    )
+                    rdf_split.split_rdf(
+                        rdf_source, parts=args.split, target_size=target_size
+                    )
+            except (ValueError, OSError) as _e:
+                print("Error: ", rdf_source, _e)
+                failed += 1
+        return 1 if failed else 0
+
+    from rdfmodule import rdf_fixer
+
+    if args.merge and args.dry_run:
+        rdf_files = [
+            rdf_file
+            for rdf_source in args.sources
+            for rdf_file in rdf_fixer.files_to_read(
+                rdf_source, skip_fixed=False
+            ).rdf_source
+        ]
+        for rdf_file in rdf_files:
+            print("Would merge: ", rdf_file)
+        print(f"{len(rdf_files)} file(s) to merge into {args.merge} (dry run).")
+        return 0
+
+    if args.merge:
+        summary = rdf_fixer.merge(
+            args.sources,
+            args.merge,
+            output_format=args.format,
+            deduplicate=not args.keep_duplicates,
+            workers=args.workers,
+            smiles_workers=args.smiles_workers,
+            cache_size=args.cache_size,
+            cache_file=args.cache_file,
+            chunk_size=args.chunk_size or rdf_fixer.DEFAULT_CHUNK_SIZE,
+            smiles_profile=args.smiles_profile,
+        )
+        return 1 if summary.failed else 0
+
+    failed = 0
+    for rdf_source in args.sources:
+        fix = functools.partial(rdf_fixer.fix, workers=args.workers)
+        if args.parts:
+            from rdfmodule import rdf_split
+
+            # the shards in parallel, as many processes as shards unless given
+            workers = args.workers if args.workers > 1 else None
+            fix = functools.partial(
+                rdf_split.fix_in_parts, parts=args.parts, workers=workers
+            )
+        summary = fix(
+            rdf_source,
+            convert_to_csv=not args.fix_only,
+            write_fixed=not args.no_fixed,
+            smiles_workers=args.smiles_workers,
+            cache_size=args.cache_size,
+            cache_file=args.cache_file,
+            chunk_size=args.chunk_size,
+            output_format=args.format,
+            database=args.database,
+            smiles_profile=args.smiles_profile,
+            identifiers=args.identifiers,
+            incremental=args.incremental,
+            compress_output=args.compress,
+            metrics_log=args.metrics_log,
+            dry_run=args.dry_run,
+        )
+        failed += len(summary.failed)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Long ("tidy") output of the converted reactions: three tab separated tables
+instead of one wide table with a column per $DTYPE tag. Their size grows with
+the values actually present, not with reactions x distinct tags
+(e.g. SciFinder exports with many VAR(n):...:CAS_RN variants).
+
+    <name>_reactions.csv: rxn_id, number_reagents, number_products
+    <name>_molecules.csv: rxn_id, role ("reagent" or "product"),
+                          position (within the role), smiles
+    <name>_fields.csv:    rxn_id, field (the column name of the wide csv), value
+
+The same layout as the SQLite output (see sqlite_output.py), per file (hence without
+source_id) and written as a stream:
+every entry is written as it comes (as in the chunked csv, a repeated ID has
+rows for each of its entries), empty molblocks and the copyright are left out.
+
+Example:
+    import pandas as pd
+    fields = pd.read_csv("export_fields.csv", sep="\\t")
+    yields = fields[fields.field.str.endswith("YIELD")]
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import csv
+import os
+from typing import Dict, List, Optional, Tuple
+
+from rdfmodule.rdf_parser import RdfRecord, open_text, strip_compression
+
+# table -> columns
+LONG_TABLES = {
+    "reactions": ["rxn_id", "number_reagents", "number_products"],
+    "molecules": ["rxn_id", "role", "position", "smiles"],
+    "fields": ["rxn_id", "field", "value"],
+}
+
+
+def long_rows(
+    records: List[RdfRecord], all_smiles: List[Optional[str]]
+) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    """The rows of the reactions, molecules and fields tables (see LONG_TABLES)
+    for a batch of records; empty molblocks and the copyright are left out.
+
+    Args:
+        records: parsed entries
+        all_smiles: the SMILES of all molecules of the records, in order
+            (see rdf_fixer.smiles_in_chunks)
+    Returns:
+        (reactions, molecules, fields) rows, in record order.
+    """
+    reactions = []
+    molecules = []
+    fields = []
+    smiles_of_molecules = iter(all_smiles)
+    for record in records:
+        rxn_id = record.rxn_id
+        reactions.append((rxn_id, record.number_reagents, record.number_products))
+        for i, mol_string in enumerate(record.molecules):
+            mol_smiles = next(smiles_of_molecules)
+            if mol_string == "":
+                continue
+            if i < record.number_reagents:
+                molecules.append((rxn_id, "reagent", i, mol_smiles))
+            else:
+                role_position = i - record.number_reagents
+                molecules.append((rxn_id, "product", role_position, mol_smiles))
+        # skip the copyright (optional), as in the table outputs
+        fields += [
+            (rxn_id, field, value)
+            for field, value in record.fields.items()
+            if "COPYRIGHT" not in field
+        ]
+    return reactions, molecules, fields
+
+
+def long_file_names(rdf_file_csv: str) -> Dict[str, str]:
+    """The file of each table, e.g. "export.csv.gz" -> "export_fields.csv.gz"."""
+    compression = rdf_file_csv[len(strip_compression(rdf_file_csv)) :]
+    base, extension = os.path.splitext(strip_compression(rdf_file_csv))
+    return {table: f"{base}_{table}{extension}{compression}" for table in LONG_TABLES}
+
+
+class LongTableWriter:
+    """
+    Writes the reactions of one RDF file into the three long tables, batch by batch.
+    Only the current batch is held in memory.
+    """
+
+    def __init__(self, rdf_file_csv: str):
+        self.file_names = long_file_names(rdf_file_csv)
+        self._files = {}
+        self._writers = {}
+        try:
+            for table, columns in LONG_TABLES.items():
+                self._files[table] = open_text(self.file_names[table], "w", newline="")
+                writer = csv.writer(
+                    self._files[table], delimiter="\t", lineterminator="\n"
+                )
+                writer.writerow(columns)
+                self._writers[table] = writer
+        except Exception:
+            self.close()
+            raise
+
+    def write(self, records: List[RdfRecord], all_smiles: List[Optional[str]]) -> None:
+        """Writes one batch of reactions.
+
+        Args:
+            records: parsed entries
+            all_smiles: the SMILES of all molecules of the records, in order
+                (see rdf_fixer.smiles_in_chunks)
+        """
+        reactions, molecules, fields = long_rows(records, all_smiles)
+        self._writers["reactions"].writerows(reactions)
+        self._writers["molecules"].writerows(molecules)
+        self._writers["fields"].writerows(fields)
+
+    def close(self) -> None:
+        for file_out in self._files.values():
+            file_out.close()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Manifest for incremental runs of fix().
+Kept as ".rdf_fixer_manifest.json" at the top of a tree (or next to a single file).
+Per source file: size, mtime, SHA-256, the options used and the outputs with their
+size and mtime. A file is only processed again if it is new, its content changed
+(a source only touched is recognized by its hash), the options changed, or one of
+its outputs is missing or has another size or mtime than when it was written.
+The outputs are not hashed, that would mean reading them all again.
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+MANIFEST_NAME = ".rdf_fixer_manifest.json"
+
+
+def file_hash(file_name: str) -> str:
+    """SHA-256 of a file, read in blocks."""
+    sha = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def manifest_root(rdf_source: str) -> str:
+    """The directory the manifest of a fix() run lives in."""
+    if os.path.isdir(rdf_source):
+        return rdf_source
+    return os.path.dirname(os.path.abspath(rdf_source))
+
+
+class Manifest:
+    """
+    Loads, checks and updates the manifest of a tree.
+    Paths are stored relative to the root, so a tree can be moved.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.file_name = os.path.join(root, MANIFEST_NAME)
+        self.entries: Dict[str, dict] = {}
+        if os.path.isfile(self.file_name):
+            with open(self.file_name, encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    def _key(self, file_name: str) -> str:
+        return os.path.relpath(os.path.abspath(file_name), os.path.abspath(self.root))
+
+    def is_current(self, rdf_file_in: str, outputs: List[str], options: dict) -> bool:
+        """True if the file was processed before with the same content and options,
+        and its outputs are still there with the same size and mtime."""
+        entry = self.entries.get(self._key(rdf_file_in))
+        if entry is None or entry["options"] != options:
+            return False
+
+        for output in outputs:
+            known = entry["outputs"].get(self._key(output))
+            if known is None or not os.path.isfile(output):
+                return False
+            stat = os.stat(output)
+            if (stat.st_size, stat.st_mtime_ns) != (
+                known["size"],
+                known.get("mtime_ns"),
+            ):
+                return False
+
+        stat = os.stat(rdf_file_in)
+        if (stat.st_size, stat.st_mtime_ns) == (entry["size"], entry["mtime_ns"]):
+            return True
+        if stat.st_size != entry["size"] or file_hash(rdf_file_in) != entry["sha256"]:
+            return False
+        # only touched, content the same
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def update(self, rdf_file_in: str, outputs: List[str], options: dict) -> None:
+        """Records a processed file with its outputs."""
+        stat = os.stat(rdf_file_in)
+        self.entries[self._key(rdf_file_in)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_hash(rdf_file_in),
+            "options": options,
+            "outputs": {
+                self._key(output): {
+                    "size": os.stat(output).st_size,
+                    "mtime_ns": os.stat(output).st_mtime_ns,
+                }
+                for output in outputs
+            },
+        }
+
+    def save(self) -> None:
+        temp_name = self.file_name + ".tmp"
+        with open(temp_name, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": 1, "files": self.entries}, f, indent=1, sort_keys=True
+            )
+        os.replace(temp_name, self.file_name)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in metrics of fix(): wall time per stage and counters, per file.
+Stages are timed exclusively (a stage running within another one is not counted twice),
+so the stage times add up to the total time of the file.
+
+Stages:
+    read: reading (and decompressing) the original file, incl. the fixing rules
+    write_fixed: writing the "_fixed.rdf" file
+    schema: the quick column scan (chunked and columnar output)
+    parse: splitting the entries into molecules and data fields, source detection
+    smiles: RDKit, molblock to SMILES (incl. the cache)
+    table: building the table rows (and DataFrames)
+    write: writing the csv (or Parquet/Feather) file
+    other: the rest
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class FileStats:
+    """
+    Metrics of one file: seconds per stage, reactions and molecules processed,
+    molecules RDKit couldn't read (rdkit_failures), bytes read and written.
+    error is the error text if the file failed.
+    """
+
+    def __init__(self, rdf_file: str):
+        self.rdf_file = rdf_file
+        self.seconds: Dict[str, float] = {}
+        self.reactions = 0
+        self.molecules = 0
+        self.rdkit_failures = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.error: Optional[str] = None
+        self._stages: List[str] = []
+        self._since = 0.0
+
+    def __str__(self):
+        stages = ", ".join(f"{stage} {s:.2f}s" for stage, s in self.seconds.items())
+        return (
+            f"{self.rdf_file}: {self.reactions} reactions, {self.molecules} molecules "
+            f"({self.rdkit_failures} failed) in {self.total_seconds:.2f}s ({stages})"
+        )
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def _charge(self, now: float) -> None:
+        """Adds the time since the last change to the running stage."""
+        stage = self._stages[-1]
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + now - self._since
+        self._since = now
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times a block as stage name, pausing the stage it runs in."""
+        now = time.perf_counter()
+        if self._stages:
+            self._charge(now)
+        else:
+            self._since = now
+        self._stages.append(name)
+        try:
+            yield
+        finally:
+            self._charge(time.perf_counter())
+            self._stages.pop()
+
+    def timed(self, items: Iterable, name: str) -> Iterator:
+        """Passes the items on, the time spent producing them counts as stage name."""
+        iterator = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self) -> dict:
+        return {
+            "file": self.rdf_file,
+            "seconds": round(self.total_seconds, 6),
+            "stages": {stage: round(s, 6) for stage, s in self.seconds.items()},
+            "reactions": self.reactions,
+            "molecules": self.molecules,
+            "rdkit_failures": self.rdkit_failures,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "error": self.error,
+        }
+
+    def to_json(self) -> str:
+        """One line of JSON."""
+        return json.dumps(self.as_dict())
+
+
+def stage(stats: Optional[FileStats], name: str):
+    """FileStats.stage, or nothing if metrics are off (stats is None)."""
+    if stats is None:
+        return nullcontext()
+    return stats.stage(name)
+
+
+def timed(stats: Optional[FileStats], items: Iterable, name: str) -> Iterable:
+    """FileStats.timed, or the items as they are if metrics are off (stats is None)."""
+    if stats is None:
+        return items
+    return stats.timed(items, name)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Molblock to SMILES conversion, with the RDKit objects built once per process.
+RDKit itself is only imported with the first converter (fix-only runs don't need it).
+
+Profiles:
+    full: sanitize and normalize (RDKit standard normalizations), the default
+    sanitize: sanitized canonical SMILES, no normalization
+    raw: canonical SMILES without sanitization, the cheapest;
+        written as in the molblock (Kekulé form, no aromaticity perception),
+        molecules RDKit would reject are then still written
+
+Optionally the InChIKey is generated from the same (parsed, normalized) molecule;
+reaction_hash builds a stable reaction identity from the InChIKeys.
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+SMILES_PROFILES = ("full", "sanitize", "raw")
+
+
+class MolConverter:
+    """
+    Converts molblocks to SMILES according to a profile (see SMILES_PROFILES).
+    The normalizer is built once, not on every molecule.
+    """
+
+    def __init__(self, profile: str = "full"):
+        if profile not in SMILES_PROFILES:
+            raise ValueError(f"Unknown SMILES profile: {profile}")
+        import rdkit.Chem as rdc
+        from rdkit import RDLogger
+        from rdkit.Chem.MolStandardize import rdMolStandardize
+
+        # Important, or else waaaay too many RDkit details in output
+        RDLogger.logger().setLevel(RDLogger.CRITICAL)
+
+        self.profile = profile
+        self._rdc = rdc
+        self._normalizer = None
+        if profile == "full":
+            self._normalizer = rdMolStandardize.Normalizer()
+
+    def smiles(self, mol_string: str) -> Optional[str]:
+        """Converts a single molblock into a SMILES.
+
+        Args:
+            mol_string: molblock text, can be empty
+        Returns:
+            SMILES string; "" for an empty molblock,
+            None if RDKit can't read or sanitize the molecule (it is then skipped).
+        """
+        mol = self._mol(mol_string)
+        if mol is None:
+            return "" if mol_string == "" else None
+        return self._to_smiles(mol)
+
+    def identifiers(self, mol_string: str) -> Tuple[Optional[str], Optional[str]]:
+        """SMILES and InChIKey of a single molblock, the molecule is parsed once.
+
+        Returns:
+            (SMILES, InChIKey); ("", "") for an empty molblock, (None, None) if RDKit
+            can't read the molecule, InChIKey None if InChI can't handle it.
+        """
+        mol = self._mol(mol_string)
+        if mol is None:
+            return ("", "") if mol_string == "" else (None, None)
+        smiles = self._to_smiles(mol)
+        if smiles is None:
+            return None, None
+        try:
+            inchikey = self._rdc.MolToInchiKey(mol) or None
+        except (RuntimeError, ValueError):
+            inchikey = None
+        return smiles, inchikey
+
+    def _to_smiles(self, mol) -> Optional[str]:
+        """MolToSmiles; without sanitization (raw) it can fail, the molecule is skipped."""
+        if self.profile != "raw":
+            return self._rdc.MolToSmiles(mol)
+        try:
+            return self._rdc.MolToSmiles(mol)
+        except RuntimeError as _e:
+            print("Error: ", _e)
+            return None
+
+    def _mol(self, mol_string: str):
+        """The RDKit molecule of a molblock, prepared according to the profile;
+        None for an empty molblock or if RDKit can't read or sanitize it."""
+        if mol_string == "":
+            return None
+
+        rdc = self._rdc
+
+        mol = rdc.MolFromMolBlock(mol_string, sanitize=False)
+        if mol is None:
+            return None
+
+        if self.profile == "raw":
+            try:
+                mol.UpdatePropertyCache(strict=False)
+                return mol
+            except RuntimeError as _e:
+                print("Error: ", _e)
+                return None
+
+        try:
+            rdc.SanitizeMol(mol)
+        except ValueError as _e:
+            print("Error: ", _e)
+            return None
+        if self.profile == "sanitize":
+            return mol
+
+        mol.UpdatePropertyCache(strict=False)
+        rdc.SanitizeMol(
+            mol,
+            sanitizeOps=(
+                rdc.SANITIZE_ALL ^ rdc.SANITIZE_CLEANUP ^ rdc.SANITIZE_PROPERTIES
+            ),
+        )
+        return self._normalizer.normalize(mol)
+
+
+_process_converters: Dict[str, MolConverter] = {}
+
+
+def get_converter(profile: str = "full") -> MolConverter:
+    """One converter per process and profile (also within worker processes)."""
+    if profile not in _process_converters:
+        _process_converters[profile] = MolConverter(profile)
+
+    return _process_converters[profile]
+
+
+def reaction_hash(
+    reagent_inchikeys: List[Optional[str]], product_inchikeys: List[Optional[str]]
+) -> str:
+    """
+    Stable identity of a reaction: SHA-1 of the sorted reagent and product InChIKeys.
+    Independent of the molecule order, the SMILES profile and the RDKit version
+    (as far as the InChIKeys are); "" if an InChIKey is missing.
+    """
+    if None in reagent_inchikeys or None in product_inchikeys:
+        return ""
+    text = (
+        ".".join(sorted(reagent_inchikeys)) + ">>" + ".".join(sorted(product_inchikeys))
+    )
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
@@ -9,6 +9,7 @@ decoding issue fixed, now utf-8 encoding.
 run by calling
 rdf_fixer.fix(filename or path, flag)
 flag = False; or True (default)
+optionally workers=n to handle files in parallel processes
 
 @author: Alexander Minidis (DocMinus)
 
@@ -16,20 +17,57 @@ license: MIT License
 Copyright (c) 2021-2024 DocMinus
 """
 
-
+import functools
+import itertools
+import math
 import os
-import re
-from enum import Enum
-from typing import Tuple
-
-import numpy as np
-import pandas as pd
-import rdkit.Chem as rdc
-from rdkit import RDLogger
-from rdkit.Chem.MolStandardize import rdMolStandardize
-
-# Important, or else waaaay too many RDkit details in output
-RDLogger.logger().setLevel(RDLogger.CRITICAL)
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from rdfmodule.arrow_output import FILE_EXTENSIONS, OUTPUT_FORMATS, ArrowTableWriter
+from rdfmodule.long_output import LongTableWriter, long_file_names
+from rdfmodule.manifest import Manifest, manifest_root
+from rdfmodule.metrics import FileStats, stage, timed
+from rdfmodule.molecules import SMILES_PROFILES, get_converter, reaction_hash
+from rdfmodule.rdf_parser import (
+    RdfRecord,
+    RdfSchema,
+    detect_file_type,
+    fixed_blocks,
+    open_bytes,
+    open_text,
+    parse_blocks,
+    read_records,
+    scan_schema,
+    scan_schema_blocks,
+    strip_compression,
+)
+from rdfmodule.rdf_split import SPLIT_EXTENSION
+from rdfmodule.smiles_cache import SmilesCache, get_smiles_cache, split_by_cache
+from rdfmodule.sqlite_output import SqliteWriter
+
+# pandas (and RDKit, see molecules.py) are imported where needed (conversion only),
+# fix-only runs and the command line start without them.
+if TYPE_CHECKING:
+    import pandas as pd
+# molblocks per chunk (at most) when SMILES are generated by a process pool
+# molblocks per chunk when SMILES are generated by a process pool
+SMILES_CHUNK_SIZE = 1000
+# reactions per batch (row group) for the columnar output formats
+DEFAULT_CHUNK_SIZE = 10000
 
 
 class Files:
@@ -48,14 +86,22 @@ class Files:
         # one could access variables in init instead.
 
 
-def files_to_read(rdf_source: str) -> Files:
+def files_to_read(
+    rdf_source: str, skip_fixed=True, compress_output: Optional[str] = None
+) -> Files:
     """Retrieving all .RDF files in a subdirectory recursively, or only a single rdf file.
     Is called by the fix() function.
+    Compressed RDF files (e.g. ".rdf.gz", see rdf_parser.COMPRESSED_EXTENSIONS) are included.
+    Subdirectories with a split manifest (the shards of rdf_split) are left out.
 
     Parts of os.walk snippet originated on Reddit somewhere, forgot where though.
 
     Args:
         rdf_source: filename, alt. directory and subdirectories to scan
+        skip_fixed: default True, skips files that have a "_fixed.rdf" file already.
+            False keeps them (the fixed files themselves are never input).
+        compress_output: optional compression extension for the output names,
+            e.g. "gz" gives "_fixed.rdf.gz" and ".csv.gz".
     Returns:
         resolved filenames via Files() class.
     """
@@ -63,116 +109,463 @@ def files_to_read(rdf_source: str) -> Files:
     file_list_in = []
     file_list_ok = []
     file_list_csv = []
+    out_extension = "." + compress_output if compress_output else ""
+
+    def is_rdf(file: str) -> bool:
+        return strip_compression(file).endswith(("rdf", "RDF"))
+
+    def is_fixed(file: str) -> bool:
+        return strip_compression(file).endswith("_fixed.rdf")
+
+    def base_name(file: str) -> str:
+        # name without (compression and) rdf extension
+        return os.path.splitext(strip_compression(file))[0]
 
     if os.path.isfile(rdf_source):
-        if rdf_source.endswith(("rdf", "RDF")):
-            file_list_in.append(os.path.join(rdf_source))
-            if rdf_source.endswith("_fixed.rdf"):
+        if is_rdf(rdf_source):
+            if is_fixed(rdf_source):
                 # checks for existing fixed files and removes from the list
                 # as well as the 'unfixed" file (since already done)
                 print("File already fixed: ", rdf_source)
-                del file_list_in[-1]
-                file_list_in.remove(rdf_source)
-                # since single file, could just as well use file_list_in.clear()
             else:
-                file_list_ok.append(os.path.splitext(rdf_source)[0] + "_fixed.rdf")
-                file_list_csv.append(os.path.splitext(rdf_source)[0] + ".csv")
+                file_list_in.append(os.path.join(rdf_source))
+                file_list_ok.append(
+                    base_name(rdf_source) + "_fixed.rdf" + out_extension
+                )
+                file_list_csv.append(base_name(rdf_source) + ".csv" + out_extension)
 
     elif os.path.isdir(rdf_source):
         for subdir, dirs, files in os.walk(rdf_source):
+            if subdir != rdf_source and any(f.endswith(SPLIT_EXTENSION) for f in files):
+                # shards of a split (see rdf_split), processed only when given
+                # themselves, else their reactions would be there twice
+                if skip_fixed:
+                    print("Shards of a split left out: ", subdir)
+                dirs[:] = []
+                continue
             _item_to_remove = []
             for file in files:
-                if file.endswith(("rdf", "RDF")):
+                if is_rdf(file):
                     full_path_in = os.path.join(subdir, file)
-                    file_list_in.append(full_path_in)
-                    if file.endswith("_fixed.rdf"):
+                    if is_fixed(file):
                         # checks for existing fixed files and removes from the list
                         # as well as the 'unfixed" file (since already done)
+                        if not skip_fixed:
+                            continue
                         print("File already fixed: ", full_path_in)
-                        del file_list_in[-1]
                         # temp list for later removal of any original
                         # (not here in case of different file order)
-                        _item_to_remove.append(full_path_in.replace("_fixed", ""))
+                        _item_to_remove.append(
+                            base_name(full_path_in)[: -len("_fixed")]
+                        )
                     else:
+                        file_list_in.append(full_path_in)
                         file_list_ok.append(
-                            os.path.join(
-                                subdir, os.path.splitext(file)[0] + "_fixed.rdf"
-                            )
+                            base_name(full_path_in) + "_fixed.rdf" + out_extension
                         )
                         file_list_csv.append(
-                            os.path.join(subdir, os.path.splitext(file)[0] + ".csv")
+                            base_name(full_path_in) + ".csv" + out_extension
                         )
             for x in _item_to_remove:
-                file_list_in.remove(x)
+                # any original of this name (compressed or not);
+                # the lists of output names go along, same position
+                for position in reversed(range(len(file_list_in))):
+                    if base_name(file_list_in[position]) == x:
+                        del file_list_in[position]
+                        del file_list_ok[position]
+                        del file_list_csv[position]
 
     return Files(file_list_in, file_list_ok, file_list_csv)
 
 
-def fix(rdf_source: str, convert_to_csv=True) -> None:
+class FixSummary:
+    """
+    Outcome of a fix() run: files that went through, and those that failed (with the error).
+    """
+
+    def __init__(self):
+        self.succeeded: List[str] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.skipped: List[str] = []
+        # files a dry run would process
+        self.planned: List[str] = []
+        # FileStats per processed file, if metrics were on
+        self.stats: List[FileStats] = []
+
+    def __str__(self):
+        text = f"{len(self.succeeded)} file(s) done, {len(self.failed)} failed."
+        if self.planned:
+            text = f"{len(self.planned)} file(s) to do (dry run)."
+        if self.skipped:
+            text += f" {len(self.skipped)} unchanged, skipped."
+        for rdf_file_in, error in self.failed:
+            text += f"\n  failed: {rdf_file_in} ({error})"
+        return text
+
+
+class MergeSummary:
+    """
+    Outcome of a merge() run: files merged, reactions written,
+    duplicates left out (reaction ID seen before in the same source)
+    and failed files (with the error).
+    """
+
+    def __init__(self, out_file: str):
+        self.out_file = out_file
+        self.files: List[str] = []
+        self.reactions = 0
+        self.duplicates = 0
+        self.failed: List[Tuple[str, str]] = []
+
+    def __str__(self):
+        text = (
+            f"{self.out_file}: {self.reactions} reactions from {len(self.files)} file(s), "
+            f"{self.duplicates} duplicates left out, {len(self.failed)} failed."
+        )
+        for rdf_file_in, error in self.failed:
+            text += f"\n  failed: {rdf_file_in} ({error})"
+        return text
+
+
+def fix(
+    rdf_source: str,
+    convert_to_csv=True,
+    write_fixed=True,
+    workers: int = 1,
+    smiles_workers: int = 1,
+    cache_size: int = 0,
+    cache_file: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    output_format: str = "csv",
+    database: Optional[str] = None,
+    smiles_profile: str = "full",
+    identifiers=False,
+    incremental=False,
+    compress_output: Optional[str] = None,
+    metrics=False,
+    metrics_log: Optional[str] = None,
+    metrics_callback: Optional[Callable[[FileStats], None]] = None,
+    dry_run=False,
+) -> FixSummary:
     """Fix erroneous entries (empty mols) by deleting those entries.
 
     Calls files_to_read converts to csv.
+    When converting, the fixed lines are streamed straight into the csv conversion,
+    the fixed RDF file is only written alongside (no re-reading from disk).
+    A file that fails is reported, the remaining files are still processed.
 
     Args:
         rdf_source: filename, alt. directory and subdirectories to scan.
         convert_to_csv: default is True, then it will also convert to csv.
+        write_fixed: default is True, then the "_fixed.rdf" file is written.
+            False only makes sense together with convert_to_csv.
+        workers: number of processes, files are then handled in parallel.
+            default is 1 (no extra processes).
+        smiles_workers: number of processes for the SMILES generation within a file,
+            useful for few but large files. default is 1 (no extra processes).
+        cache_size: number of SMILES kept in memory per process (LRU), so repeated
+            molecules (reagents, solvents...) are converted only once. default 0 (off).
+        cache_file: optional SQLite file to keep the cached SMILES for later runs.
+        chunk_size: optional, write the csv in batches of this many reactions,
+            for bounded memory on very large files. The columns then list each
+            $DTYPE tag once (from a quick scan of the file).
+        output_format: "csv" (default, tab separated), "parquet", "feather", "sqlite"
+            or "long". The columnar formats need pyarrow and are written in row groups
+            (batches); yield, temperature and time fields get an extra numeric column.
+            "sqlite" loads the reactions into a normalized database (see sqlite_output.py).
+            "long" writes the same layout as three tab separated tables
+            (reactions, molecules, fields; see long_output.py).
+        database: optional SQLite file all files are loaded into (output_format "sqlite"),
+            default is one database per file. Kept over runs, files loaded again
+            replace their reactions.
+        smiles_profile: "full" (default, sanitized and normalized SMILES),
+            "sanitize" (no normalization) or "raw" (no sanitization, fastest).
+            See molecules.py.
+        identifiers: default False. If True, the tables (csv, Parquet, Feather) get
+            an InChIKey column per molecule column, the reaction SMILES and a stable
+            reaction hash (of the InChIKeys, see molecules.reaction_hash), for
+            de-duplication across exports. Computed from the same RDKit molecules.
+        incremental: default False. If True, a manifest (see manifest.py) in the
+            directory keeps track of processed files; only new or changed files
+            (or those with missing or rewritten outputs, or other options)
+            are processed.
+            Existing "_fixed.rdf" files don't prevent processing in this mode.
+        compress_output: optional "gz", "bz2", "xz" or "zst" (needs zstandard),
+            writes the fixed RDF and csv files compressed.
+            Compressed input files are always recognized and read on the fly.
+        metrics: default False. If True, time per stage and counters are collected
+            per file (see metrics.py), returned in FixSummary.stats.
+        metrics_log: optional file, a JSON line of metrics per file is appended.
+        metrics_callback: optional function, called with the FileStats of each file.
+            Both imply metrics=True.
+        dry_run: default False. If True, only lists the files that would be
+            processed and their outputs (FixSummary.planned), nothing is written.
     Returns:
-        None. Indirectly, converted files are the result.
+        FixSummary of succeeded, failed and skipped files (in file order).
+        Indirectly, converted files are the result.
     """
 
-    myfiles = files_to_read(rdf_source)
-    for rdf_file_in, rdf_file_ok in myfiles.rdf_to_rdffix_zipped():
-        print("Fixing File: ", rdf_file_in)
-        with open(rdf_file_in, encoding="utf-8") as file_in:
-            seed_line = file_in.readline()
-        previous_line = seed_line  # get first line as "seed" for upcoming loop
-        with open(rdf_file_ok, "w", encoding="utf-8") as file_out:
-            write_to_file: str = "dummy"  # was bool before, now a tidbit cleaner
-            counter = 0  # in case one needs to change entry enumeration
-            for current_line in open(rdf_file_in, encoding="utf-8"):
-                # prevent first line from being written twice
-                if current_line.startswith("$RDFILE") and previous_line.startswith(
-                    "$RDFILE"
-                ):
-                    continue
-
-                # correct molecule block
-                # True
-                write_to_file = current_line.startswith(
-                    "$RXN"
-                ) and previous_line.startswith("$RFMT")
-                # else for empty molecule block
-                write_to_file = not (
-                    current_line.startswith("$DTYPE")
-                    and previous_line.startswith("$RFMT")
-                )
-
-                # here a correction for ICSynth RDFs that have one empty row to many
-                if current_line == "\n" and previous_line.startswith("M  END"):
-                    continue
+    myfiles = files_to_read(
+        rdf_source, skip_fixed=not incremental, compress_output=compress_output
+    )
+    options = dict(
+        convert_to_csv=convert_to_csv,
+        write_fixed=write_fixed,
+        smiles_workers=smiles_workers,
+        cache_size=cache_size,
+        cache_file=cache_file,
+        chunk_size=chunk_size,
+        output_format=output_format,
+        database=database,
+        smiles_profile=smiles_profile,
+        identifiers=identifiers,
+        metrics=metrics or metrics_log is not None or metrics_callback is not None,
+    )
+    jobs = [
+        (rdf_file_in, rdf_file_ok, rdf_file_csv, options)
+        for rdf_file_in, rdf_file_ok, rdf_file_csv in zip(
+            myfiles.rdf_source, myfiles.rdf_fixed, myfiles.csv_file
+        )
+    ]
+
+    summary = FixSummary()
+    manifest = None
+    if incremental:
+        manifest = Manifest(manifest_root(rdf_source))
+        # only the options that change the outputs
+        output_options = {
+            key: options[key]
+            for key in (
+                "convert_to_csv",
+                "write_fixed",
+                "chunk_size",
+                "output_format",
+                "smiles_profile",
+            )
+        }
+        if database is not None:
+            output_options["database"] = os.path.abspath(database)
+        if identifiers:
+            output_options["identifiers"] = True
+        jobs_to_do = []
+        for job in jobs:
+            if manifest.is_current(job[0], _output_files(*job), output_options):
+                print("Unchanged, skipped: ", job[0])
+                summary.skipped.append(job[0])
+            else:
+                jobs_to_do.append(job)
+        jobs = jobs_to_do
+
+    if dry_run:
+        for job in jobs:
+            print("To do: ", job[0], "->", ", ".join(_output_files(*job)))
+            summary.planned.append(job[0])
+        print(summary)
+        return summary
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_fix_file_job, jobs))
+    else:
+        outcomes = [_fix_file_job(job) for job in jobs]
+
+    for job, (error, stats) in zip(jobs, outcomes):
+        if stats is not None:
+            _report_stats(stats, summary, metrics_log, metrics_callback)
+        if error is None:
+            summary.succeeded.append(job[0])
+            if manifest is not None:
+                manifest.update(job[0], _output_files(*job), output_options)
+        else:
+            summary.failed.append((job[0], error))
+    if manifest is not None:
+        manifest.save()
+    print(summary)
+
+    return summary
+
+
+def _report_stats(
+    stats: FileStats,
+    summary: FixSummary,
+    metrics_log: Optional[str],
+    metrics_callback: Optional[Callable[[FileStats], None]],
+) -> None:
+    """Hands the metrics of a file over: summary, JSON log line and callback."""
+    print(stats)
+    summary.stats.append(stats)
+    if metrics_log is not None:
+        with open(metrics_log, "a", encoding="utf-8") as f:
+            f.write(stats.to_json() + "\n")
+    if metrics_callback is not None:
+        metrics_callback(stats)
+
+
+def _output_files(
+    rdf_file_in: str, rdf_file_ok: str, rdf_file_csv: str, options: dict
+) -> List[str]:
+    """The files fix_file writes for a job.
+    (A database shared by all files is not counted, it changes with every file.)"""
+    outputs = []
+    if options["write_fixed"]:
+        outputs.append(rdf_file_ok)
+    if options["convert_to_csv"] and options.get("database") is None:
+        outputs += _table_files(rdf_file_csv, options["output_format"])
+    return outputs
+
+
+def _output_file_name(rdf_file_csv: str, output_format: str) -> str:
+    """The csv file name, with the extension of the output format.
+    (Parquet/Feather have their own compression, a compression extension is dropped.)"""
+    if output_format in ("csv", "long"):
+        return rdf_file_csv
+    return (
+        os.path.splitext(strip_compression(rdf_file_csv))[0]
+        + FILE_EXTENSIONS[output_format]
+    )
+
+
+def _table_files(rdf_file_csv: str, output_format: str) -> List[str]:
+    """The file(s) of the table output, three for the long tables."""
+    rdf_file_csv = _output_file_name(rdf_file_csv, output_format)
+    if output_format == "long":
+        return list(long_file_names(rdf_file_csv).values())
+    return [rdf_file_csv]
+
+
+def _fix_file_job(job: tuple) -> Tuple[Optional[str], Optional[FileStats]]:
+    """
+    Runs fix_file for one set of arguments, also in a worker process.
+    Returns None if all went well, else the error as text;
+    and the FileStats of the file if metrics are on.
+    """
+    rdf_file_in, rdf_file_ok, rdf_file_csv, options = job
+    options = dict(options)
+    stats = FileStats(rdf_file_in) if options.pop("metrics", False) else None
+    try:
+        with stage(stats, "other"):
+            fix_file(rdf_file_in, rdf_file_ok, rdf_file_csv, **options, stats=stats)
+    except Exception as _e:
+        print("Error: ", rdf_file_in, _e)
+        error = f"{type(_e).__name__}: {_e}"
+        if stats is not None:
+            stats.error = error
+        return error, stats
+
+    return None, stats
+
+
+def fix_file(
+    rdf_file_in: str,
+    rdf_file_ok: str,
+    rdf_file_csv: str,
+    convert_to_csv=True,
+    write_fixed=True,
+    smiles_workers: int = 1,
+    cache_size: int = 0,
+    cache_file: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    output_format: str = "csv",
+    database: Optional[str] = None,
+    smiles_profile: str = "full",
+    identifiers=False,
+    stats: Optional[FileStats] = None,
+) -> None:
+    """Fixes (and converts) a single RDF file, see fix().
 
-                # old entries use lower case rxn. Change to upper case. faster without if check.
-                previous_line = previous_line.replace("rxn:", "RXN:")
+    Args:
+        rdf_file_in: original RDF file
+        rdf_file_ok: the fixed RDF file to write
+        rdf_file_csv: resulting CSV file (incl. path)
+        convert_to_csv: also convert to csv.
+        write_fixed: write the fixed RDF file.
+        smiles_workers: processes for the SMILES generation.
+        cache_size: size of the in-memory SMILES cache, 0 is off.
+        cache_file: SQLite file for the SMILES cache.
+        chunk_size: write the csv in batches of this many reactions.
+        output_format: "csv", "parquet", "feather", "sqlite" or "long"; the file
+            extension of rdf_file_csv is changed accordingly ("long": the base name
+            of the three tables).
+        database: SQLite file to load into (output_format "sqlite"), instead of
+            one next to rdf_file_csv.
+        smiles_profile: "full", "sanitize" or "raw" (see molecules.py).
+        identifiers: add InChIKeys, reaction SMILES and reaction hash to the table.
+        stats: optional FileStats, filled with the metrics of this file.
+    Returns:
+        None - output are the new files.
+    """
 
-                # here a correction for (old) Spresi Rdfs (also Marvin???)
-                # else a csv conversion won't work without extensive changes
-                previous_line = previous_line.replace(
-                    "$RFMT\n", ("$RFMT $RIREG " + str(counter) + "\n")
-                )
-                counter += 1
+    print("Fixing File: ", rdf_file_in)
+    if not convert_to_csv:
+        if write_fixed:
+            with open_bytes(rdf_file_ok, "wb") as file_out, stage(stats, "write_fixed"):
+                file_out.writelines(timed(stats, fixed_blocks(rdf_file_in), "read"))
+        _count_bytes(stats, rdf_file_in, [rdf_file_ok] if write_fixed else [])
+        return None
+
+    print("Converting to csv: ", rdf_file_in)
+    smiles_cache = None
+    if cache_size > 0 or cache_file is not None:
+        smiles_cache = get_smiles_cache(
+            cache_size, cache_file, _cache_profile(smiles_profile, identifiers)
+        )
+    if chunk_size is None and output_format != "csv":
+        chunk_size = DEFAULT_CHUNK_SIZE
+    rdf_file_csv = _output_file_name(rdf_file_csv, output_format)
+    if output_format == "sqlite" and database is not None:
+        rdf_file_csv = database
+    csv_options = dict(
+        smiles_workers=smiles_workers,
+        smiles_cache=smiles_cache,
+        chunk_size=chunk_size,
+        output_format=output_format,
+        smiles_profile=smiles_profile,
+        identifiers=identifiers,
+        source_file=rdf_file_in,
+        stats=stats,
+    )
+    # the source of the whole file, before streaming (as rdf_origin did)
+    with stage(stats, "read"):
+        rdf_type = detect_file_type(rdf_file_in)
+    if chunk_size is not None and output_format not in ("sqlite", "long"):
+        # quick extra pass for the columns, the csv is written before the end is read
+        with stage(stats, "schema"):
+            csv_options["schema"] = scan_schema_blocks(
+                fixed_blocks(rdf_file_in), rdf_type
+            )
+    # fixed and parsed on the bytes level, in blocks of whole entries
+    blocks = timed(stats, fixed_blocks(rdf_file_in), "read")
+    if write_fixed:
+        with open_bytes(rdf_file_ok, "wb") as file_out:
+            blocks = timed(stats, _written_to(blocks, file_out), "write_fixed")
+            records = timed(stats, parse_blocks(blocks, rdf_type), "parse")
+            csv_from_records(records, rdf_file_csv, **csv_options)
+    else:
+        records = timed(stats, parse_blocks(blocks, rdf_type), "parse")
+        csv_from_records(records, rdf_file_csv, **csv_options)
+    outputs = [rdf_file_csv]
+    if output_format == "long":
+        outputs = list(long_file_names(rdf_file_csv).values())
+    _count_bytes(stats, rdf_file_in, ([rdf_file_ok] if write_fixed else []) + outputs)
 
-                if write_to_file:
-                    file_out.write(previous_line)
+    return None
 
-                previous_line = current_line
 
-            file_out.write(previous_line)
-            # the last line is not caught in the loop, hence written out here.
+def _count_bytes(
+    stats: Optional[FileStats], rdf_file_in: str, outputs: List[str]
+) -> None:
+    """Bytes read (the original file, compressed if so) and written, for the metrics."""
+    if stats is None:
+        return None
+    stats.bytes_read += os.path.getsize(rdf_file_in)
+    stats.bytes_written += sum(os.path.getsize(output) for output in outputs)
 
-    if convert_to_csv:
-        convert(myfiles)
 
-    return None
+def _written_to(blocks: Iterable[bytes], file_out: BinaryIO) -> Iterator[bytes]:
+    """Passes the blocks on, writing each to file_out on the way (side output)."""
+    for block in blocks:
+        file_out.write(block)
+        yield block
 
 
 def convert(myfiles: Files) -> None:
@@ -186,559 +579,742 @@ def convert(myfiles: Files) -> None:
     return None
 
 
-def csv_from_rdf(rdf_file_ok: str, rdf_file_csv: str) -> None:
+def merge(
+    rdf_source: Union[str, List[str]],
+    out_file: str,
+    output_format: str = "csv",
+    deduplicate=True,
+    workers: int = 1,
+    smiles_workers: int = 1,
+    cache_size: int = 0,
+    cache_file: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    smiles_profile: str = "full",
+) -> MergeSummary:
+    """Converts all RDF files of a directory tree (or several) into one table.
+
+    The files are scanned first (in parallel, see rdf_stats), for one union schema:
+    the most Reagent/Product columns of any file and all $DTYPE tags of all files.
+    Then each file is fixed on the fly and its rows are streamed into out_file,
+    in batches of chunk_size reactions; no per file outputs are written.
+    The first column "source_file" names the RDF file of a row.
+
+    Args:
+        rdf_source: directory (or file), or a list of these.
+        out_file: the merged csv (tab separated, can be compressed, e.g. ".csv.gz"),
+            Parquet or Feather file.
+        output_format: "csv" (default), "parquet" or "feather".
+        deduplicate: default True, a reaction ID seen before in a file of the same
+            source (Reaxys, SciFinder, ...) is left out. The numbers given to
+            entries without ID (Spresi) are not IDs, these entries are all kept.
+        workers: processes for the scan of the files.
+        smiles_workers, cache_size, cache_file, smiles_profile: see fix().
+        chunk_size: reactions per batch (row group).
+    Returns:
+        MergeSummary. A file failing while converted keeps the rows
+        written before the error.
+    """
+    from rdfmodule import rdf_stats
+
+    if output_format not in ("csv", "parquet", "feather"):
+        raise ValueError(f"Unknown output format for merging: {output_format}")
+    rdf_sources = [rdf_source] if isinstance(rdf_source, str) else rdf_source
+    summary = MergeSummary(out_file)
+
+    print("Scanning: ", ", ".join(rdf_sources))
+    all_stats = [
+        stats
+        for source in rdf_sources
+        for stats in rdf_stats.scan(source, workers=workers)
+    ]
+    tags: Dict[str, None] = {}
+    for stats in all_stats:
+        if stats.error is not None:
+            summary.failed.append((stats.rdf_file, stats.error))
+        else:
+            tags.update(dict.fromkeys(stats.tags))
+    rdf_files = [stats.rdf_file for stats in all_stats if stats.error is None]
+    max_reagents = max([stats.max_reagents for stats in all_stats], default=0)
+    max_products = max([stats.max_products for stats in all_stats], default=0)
+    columns = [f"Reagent{i}" for i in range(max_reagents)]
+    columns += [f"Product{i}" for i in range(max_products)]
+    schema = RdfSchema(max_reagents, max_products, columns + list(tags))
+    # skip the copyright (optional)
+    columns_out = ["source_file"]
+    columns_out += [c for c in schema.columns if "COPYRIGHT" not in c]
+
+    smiles_cache = None
+    if cache_size > 0 or cache_file is not None:
+        smiles_cache = get_smiles_cache(cache_size, cache_file, smiles_profile)
+    # (source, reaction ID) of the reactions written
+    seen: Set[Tuple[str, str]] = set()
+
+    def new_records(rdf_file: str) -> Iterator[RdfRecord]:
+        rdf_type = detect_file_type(rdf_file)
+        numbered: Set[str] = set()
+        for record in parse_blocks(fixed_blocks(rdf_file, numbered), rdf_type):
+            if deduplicate and record.rxn_id not in numbered:
+                if (rdf_type, record.rxn_id) in seen:
+                    summary.duplicates += 1
+                    continue
+                seen.add((rdf_type, record.rxn_id))
+            yield record
+
+    if output_format == "csv":
+        file_out = open_text(out_file, "w", newline="")
+    else:
+        writer = ArrowTableWriter(out_file, columns_out, output_format)
+    try:
+        header = True
+        # one process pool for all files
+        with smiles_pool(smiles_workers) as pool:
+            for rdf_file in rdf_files:
+                print("Merging: ", rdf_file)
+                try:
+                    for ids, rows in _converted_batches(
+                        new_records(rdf_file),
+                        chunk_size,
+                        schema,
+                        smiles_workers,
+                        smiles_cache,
+                        smiles_profile,
+                        pool=pool,
+                    ):
+                        for row in rows:
+                            row["source_file"] = rdf_file
+                        if output_format == "csv":
+                            table_from_rows(ids, rows, columns_out).to_csv(
+                                file_out, sep="\t", header=header, index=True
+                            )
+                            header = False
+                        else:
+                            writer.write(ids, rows)
+                        summary.reactions += len(ids)
+                except Exception as _e:
+                    print("Error: ", rdf_file, _e)
+                    summary.failed.append((rdf_file, f"{type(_e).__name__}: {_e}"))
+                    continue
+                summary.files.append(rdf_file)
+        if output_format == "csv" and header:  # no entries at all, header only
+            table_from_rows([], [], columns_out).to_csv(file_out, sep="\t")
+    finally:
+        if output_format == "csv":
+            file_out.close()
+        else:
+            writer.close()
+    if smiles_cache is not None:
+        print(smiles_cache)
+    print(summary)
+
+    return summary
+
+
+def smiles_from_molblock(mol_string: str, profile: str = "full") -> Optional[str]:
+    """Converts a single molblock into a (normalized) SMILES.
+
+    Args:
+        mol_string: molblock text, can be empty
+        profile: "full" (default), "sanitize" or "raw", see molecules.py
+    Returns:
+        SMILES string; "" for an empty molblock,
+        None if RDKit can't read or sanitize the molecule (it is then skipped).
+    """
+    return get_converter(profile).smiles(mol_string)
+
+
+def smiles_from_molblocks(
+    mol_strings: List[str], profile: str = "full", inchikeys=False
+) -> List:
+    """smiles_from_molblock for a list (chunk) of molblocks, same order.
+    With inchikeys, (SMILES, InChIKey) per molblock (see MolConverter.identifiers)."""
+    converter = get_converter(profile)
+    if inchikeys:
+        return [converter.identifiers(mol_string) for mol_string in mol_strings]
+    return [converter.smiles(mol_string) for mol_string in mol_strings]
+
+
+@contextmanager
+def smiles_pool(smiles_workers: int) -> Iterator[Optional[ProcessPoolExecutor]]:
+    """One process pool for the SMILES generation of a whole file (or run),
+    to be passed to smiles_in_chunks; None with smiles_workers <= 1.
+    The processes only start when the first chunk is sent."""
+    if smiles_workers <= 1:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=smiles_workers) as pool:
+        yield pool
+
+
+def smiles_in_chunks(
+    mol_strings: List[str],
+    smiles_workers: int = 1,
+    chunk_size: int = SMILES_CHUNK_SIZE,
+    smiles_cache: Optional[SmilesCache] = None,
+    profile: str = "full",
+    inchikeys=False,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> List:
+    """Converts all molblocks, in chunks by a process pool if smiles_workers > 1.
+
+    Args:
+        mol_strings: molblocks, e.g. of all reactions of a file
+        smiles_workers: number of processes
+        chunk_size: at most this many molblocks are sent to a process at a time;
+            fewer where a batch would not reach all processes otherwise
+        smiles_cache: if given, only molblocks not in the cache are converted
+            (it has to be one for the same profile, see _cache_profile)
+        profile: "full" (default), "sanitize" or "raw", see molecules.py
+        inchikeys: if True, (SMILES, InChIKey) pairs instead of SMILES
+        pool: the process pool of smiles_pool(smiles_workers), to be reused
+            over the batches of a file; without it, a pool is started per call.
+    Returns:
+        results of smiles_from_molblock, in the original order.
+    """
+    if smiles_cache is not None:
+        results, pending, to_convert = split_by_cache(smiles_cache, mol_strings)
+        if inchikeys:
+            results = [_pair_from_cache(value) for value in results]
+        converted = smiles_in_chunks(
+            to_convert,
+            smiles_workers,
+            chunk_size,
+            profile=profile,
+            inchikeys=inchikeys,
+            pool=pool,
+        )
+        for (key, positions), smiles in zip(pending.items(), converted):
+            smiles_cache.store(key, _pair_to_cache(smiles) if inchikeys else smiles)
+            for i in positions:
+                results[i] = smiles
+        smiles_cache.flush()
+        return results
+
+    if smiles_workers <= 1 or len(mol_strings) <= 1:
+        return smiles_from_molblocks(mol_strings, profile, inchikeys)
+
+    if pool is None:
+        with smiles_pool(smiles_workers) as own_pool:
+            return smiles_in_chunks(
+                mol_strings,
+                smiles_workers,
+                chunk_size,
+                profile=profile,
+                inchikeys=inchikeys,
+                pool=own_pool,
+            )
+
+    # every batch spread over all processes, e.g. with small chunked batches
+    chunk_size = min(chunk_size, math.ceil(len(mol_strings) / smiles_workers))
+    chunks = [
+        mol_strings[i : i + chunk_size] for i in range(0, len(mol_strings), chunk_size)
+    ]
+    # map keeps the order of the chunks
+    return [
+        smiles
+        for chunk in pool.map(
+            functools.partial(
+                smiles_from_molblocks, profile=profile, inchikeys=inchikeys
+            ),
+            chunks,
+        )
+        for smiles in chunk
+    ]
+
+
+def _cache_profile(smiles_profile: str, identifiers: bool) -> str:
+    """Profile of the SMILES cache, the (SMILES, InChIKey) pairs are kept apart."""
+    return smiles_profile + "+inchikey" if identifiers else smiles_profile
+
+
+def _pair_to_cache(pair: Tuple[Optional[str], Optional[str]]) -> Optional[str]:
+    """(SMILES, InChIKey) as one cache value, "SMILES InChIKey" (no spaces in either)."""
+    smiles, inchikey = pair
+    if smiles is None:
+        return None
+    return f"{smiles} {inchikey or ''}"
+
+
+def _pair_from_cache(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """The (SMILES, InChIKey) of a cache value, see _pair_to_cache."""
+    if value is None:
+        return None, None
+    smiles, _, inchikey = value.partition(" ")
+    if smiles == "":
+        return "", ""
+    return smiles, inchikey or None
+
+
+def _convert_molecules(
+    records: List[RdfRecord],
+    smiles_workers: int,
+    smiles_cache: Optional[SmilesCache],
+    smiles_profile: str,
+    identifiers: bool,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Tuple[List[Optional[str]], Optional[List[Optional[str]]]]:
+    """SMILES of all molecules of the records, in order;
+    with identifiers also their InChIKeys (else None)."""
+    results = smiles_in_chunks(
+        [mol_string for record in records for mol_string in record.molecules],
+        smiles_workers,
+        smiles_cache=smiles_cache,
+        profile=smiles_profile,
+        inchikeys=identifiers,
+        pool=pool,
+    )
+    if not identifiers:
+        return results, None
+    return [smiles for smiles, _ in results], [inchikey for _, inchikey in results]
+
+
+def identifier_columns(columns: List[str], number_molecules: int) -> List[str]:
+    """
+    The columns with the identifiers: after the number_molecules Reagent/Product
+    columns, an InChIKey column for each, then ReactionSmiles and ReactionHash.
+    """
+    molecule_columns = columns[:number_molecules]
+    return (
+        molecule_columns
+        + [column + "_InChIKey" for column in molecule_columns]
+        + ["ReactionSmiles", "ReactionHash"]
+        + columns[number_molecules:]
+    )
+
+
+def csv_from_rdf(
+    rdf_file_ok: str,
+    rdf_file_csv: str,
+    smiles_workers: int = 1,
+    smiles_cache: Optional[SmilesCache] = None,
+    chunk_size: Optional[int] = None,
+    output_format: str = "csv",
+    smiles_profile: str = "full",
+    identifiers=False,
+    stats: Optional[FileStats] = None,
+) -> None:
     """CSV from RDF convert function
 
+    The RDF file is read once (see rdf_parser.read_records),
+    in chunked mode after a quick scan for the columns (see rdf_parser.scan_schema).
+
     Args:
         rdf_file_ok: new RDF file with corrections (if any)
         rdf_file_csv: resulting CSV file (incl. path)
+        smiles_workers: processes for the SMILES generation, default 1.
+        smiles_cache: optional SmilesCache for repeated molblocks.
+        chunk_size: optional, write the csv in batches of this many reactions.
+        output_format: "csv" (default), "parquet", "feather", "sqlite" or "long".
+            rdf_file_csv is then the name of that file (or database, or the base
+            name of the long tables).
+        smiles_profile: "full" (default), "sanitize" or "raw", see molecules.py.
+        identifiers: add InChIKeys, reaction SMILES and reaction hash (see fix).
+            smiles_cache then has to be one for _cache_profile(profile, True).
+        stats: optional FileStats for the metrics (see metrics.py).
     Returns:
         None - output are the new files.
     """
 
-    class RdfSource(Enum):
-        UNKNOWN = ""
-        SCIFINDER = "RXN:"
-        INFOCHEM = "RXN:"
-        REAXYS = "ROOT:"
-
-    def rdf_origin(in_file: str) -> str:
-        """
-        Determines the source of an RDF file by inspecting its contents.
-
-        Args:
-            in_file (str): The filename of the RDF file to be checked.
-
-        Returns:
-            A string indicating the source of the RDF file. The returned string
-            is used by multiple `string.replace()` methods to make the script
-            independent of the source.
-
-            Possible return values are:
-            - RdfSource.SCIFINDER if the file was generated by Scifinder.
-            - RdfSource.INFOCHEM if the file was generated by Infochem ICSynth or (corrected) SPRESI.
-            - RdfSource.REAXYS if the file was generated by Reaxys.
-        """
-        pattern_scifinder = re.compile(".+SCHEME")
-        pattern_infochem = re.compile(".+Infochem|.+ACS")
-        pattern_reaxys = re.compile(".+Marvin")
-
-        with open(in_file, encoding="utf-8") as f:
-            for line in f:
-                if pattern_scifinder.match(line) and pattern_infochem.match(line):
-                    return RdfSource.INFOCHEM.value
-                elif (
-                    pattern_scifinder.match(line)
-                    and pattern_infochem.search(line) is None
-                ):
-                    return RdfSource.SCIFINDER.value
-                elif pattern_reaxys.match(line):
-                    return RdfSource.REAXYS.value
-
-        return RdfSource.UNKNOWN.value
-
-        """
-        original hardcoded, for documentation's sake remaining here:
-
-        f = open(in_file)
-        NUMBER_OF_LINES = 12
-        line: str = []
-        for i in range(NUMBER_OF_LINES):
-            line.append(f.readline())
-        f.close()
-        _rdf = "RXN:"
-        if re.match(".+SCHEME", line[2]) and re.match(".+Infochem", line[10]):
-            # Infochem ICSynth and (corrected) SPRESI
-            pass
-        if re.match(".+SCHEME", line[2]) and re.match(".+ACS", line[11]):
-            # CAS: Scifinder
-            pass
-        if (not re.match(".+SCHEME", line[2])) and re.match(".+Marvin", line[5]):
-            # Reaxys
-            _rdf = "ROOT:"
-        return _rdf
-
-        """
-
-    def build_empty_table(in_file: str, rdf_type: str) -> Tuple[pd.DataFrame, int, int]:
-        """
-        Scans the RDF file to determine the number of reagents, products, and
-        columns, and constructs an empty pandas DataFrame with the appropriate
-        size and column names.
-
-        Args:
-            in_file (str): The filename of the corrected RDF file.
-            rdf_type (str): A string indicating the source of the RDF file,
-                which is used in replacements.
-                "RXN:" (scifinder/infochem) or string "ROOT:" (reaxys)
-
-        Returns:
-            da_table (object): the (empty) pandas df working table
-            max_reagents (int): number for later positioning of reagents smiles in table
-            max_products (int): <> (products)
-        """
-
-        # Get the IDs and use as row index
-        list_of_IDs = []
-        with open(in_file, encoding="utf-8") as f:
-            for line in f:
-                if line.startswith("$RFMT"):
-                    list_of_IDs.append(line.strip().split(" ")[2])
-
-        # Determine max no of reagents/products
-        flag = 0
-        max_reagents = 0
-        max_products = 0
-        for line in open(in_file, encoding="utf-8"):
-            if line.startswith("$RXN") | flag == 1:
-                flag = 1
-                if re.match("\s\s[0-9]\s\s[0-9]\n", line):
-                    # analyse the "  y  z" line.
-                    # implies: y reactants, z products.
-                    x = line.strip().split("  ")
-                    number_reagents = int(x[0])
-                    number_products = int(x[1])
-                    if number_reagents > max_reagents:
-                        max_reagents = number_reagents
-                    if number_products > max_products:
-                        max_products = number_products
-                    flag = 0
-
-        # Build the column headers
-        columns = [f"Reagent{i}" for i in range(max_reagents)]
-        columns += [f"Product{i}" for i in range(max_products)]
-        with open(in_file, encoding="utf-8") as f:
-            for line in f:
-                if line.startswith("$DTYPE"):
-                    columns.append((line.strip().split(" ")[1]).replace(rdf_type, ""))
-
-        # Construct the empty table
-        # da_table = pd.DataFrame(index=list_of_IDs, columns=list(OrderedDict.fromkeys(columns)))
-        da_table = pd.DataFrame(index=list_of_IDs, columns=columns)
-        return da_table, max_reagents, max_products
-
     print("Converting to csv: ", rdf_file_ok)
-    ##############################################################
-    # Initialize Table and diverse variables
-    # get string replacement variable depending on RDF source
-    RDF_TYPE = rdf_origin(rdf_file_ok)
-    # build table according to files specs. get max no of reagents & products at the same time.
-    my_table, max_reagents, max_products = build_empty_table(rdf_file_ok, RDF_TYPE)
-
-    ####################################################################
-    # Here comes the actual data extraction and addition to pandas table
-
-    #
-    ############### GET MOLECULES #############
-    # (structure same for Reaxys and Scifinder - and Infochem(?))
-    #
-
-    flag = 0
-    # 0 = generic
-    # 1 = start of reaction block
-    # 2 = single MOL (molecules)
-    # 9 = skip
-
-    molecule = []
-    number_reagents = 0
-    number_products = 0
-    number_molecules = 0
-    iterate_molecules = 0
-    mol_string = ""
-    rxn_id = ""
-    multiple_row_text = ""
-
-    # get first line as "seed" for upcoming loop
-    with open(rdf_file_ok, encoding="utf-8") as file_in:
-        seed_line = file_in.readline()
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-        # start of a new reaction block
-        if current_line.startswith("$RXN") | flag == 1:
-            flag = 1
-            if re.match("\s\s[0-9]\s\s[0-9]\n", current_line):
-                # analyse the "  y  z" line. Not hard-coding this since it might change?
-                # implies: y reactants, z product.
-                x = current_line.strip().split("  ")
-                number_reagents = int(x[0])
-                number_products = int(x[1])
-                number_molecules = number_reagents + number_products
-                # create fresh list of max no of molecules, for use in $MOL block
-                # yes, always same size within a *given file*, could change from file to file(!)
-                for i in range(number_molecules):
-                    molecule.append([])
-
-            if current_line == "\n" or re.match("\s\s[0-9]\s\s[0-9]\n", current_line):
-                # checks for empty lines and the number of molecules lines and skips them
-                continue
+    schema = None
+    if chunk_size is None and output_format != "csv":
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if chunk_size is not None and output_format not in ("sqlite", "long"):
+        with open_text(rdf_file_ok) as f, stage(stats, "schema"):
+            schema = scan_schema(f, detect_file_type(rdf_file_ok))
+    csv_from_records(
+        timed(stats, read_records(rdf_file_ok), "parse"),
+        rdf_file_csv,
+        smiles_workers=smiles_workers,
+        smiles_cache=smiles_cache,
+        chunk_size=chunk_size,
+        schema=schema,
+        output_format=output_format,
+        smiles_profile=smiles_profile,
+        identifiers=identifiers,
+        source_file=rdf_file_ok,
+        stats=stats,
+    )
 
-        # after determining a block, find the molecules within the block
-        if (current_line == "$MOL\n") | (flag == 2):
-            flag = 2
-
-            if current_line != "$MOL\n" and (iterate_molecules < number_molecules):
-                molecule[iterate_molecules].append(current_line)
-
-            if current_line == "M  END\n":
-                iterate_molecules += 1
-
-            # end of the complete reaction block
-            if current_line.startswith("$D") & (previous_line == "M  END\n"):
-                flag = 9  # could just use flag = 0(?)
-                # rebuild the string of a molecule
-                counter_reagents = 0
-                counter_products = 0
-                num_mols_this_instance = len(molecule)
-                # should always be max_mol now, so doesn't matter
-
-                for mol in range(num_mols_this_instance):
-                    mol_string = "".join(molecule[mol])
-                    if mol_string == "":
-                        smiles = ""
-                    else:
-                        mol = rdc.MolFromMolBlock(mol_string, sanitize=False)
-                        if mol is None:
-                            continue
+    return None
 
-                        try:
-                            rdc.SanitizeMol(mol)
-                        except ValueError as _e:
-                            print("Error: ", _e)
-                            continue
 
-                        mol.UpdatePropertyCache(strict=False)
-                        rdc.SanitizeMol(
-                            mol,
-                            sanitizeOps=(
-                                rdc.SANITIZE_ALL
-                                ^ rdc.SANITIZE_CLEANUP
-                                ^ rdc.SANITIZE_PROPERTIES
-                            ),
-                        )
-                        mol = rdMolStandardize.Normalize(mol)
-                        smiles = rdc.MolToSmiles(mol)
+def csv_from_records(
+    rdf_records: Iterable[RdfRecord],
+    rdf_file_csv: str,
+    smiles_workers: int = 1,
+    smiles_cache: Optional[SmilesCache] = None,
+    chunk_size: Optional[int] = None,
+    schema: Optional[RdfSchema] = None,
+    output_format: str = "csv",
+    smiles_profile: str = "full",
+    identifiers=False,
+    source_file: Optional[str] = None,
+    stats: Optional[FileStats] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> None:
+    """CSV from parsed RDF entries
+
+    All table content is taken from the records,
+    be it from a file (csv_from_rdf) or streamed from the fixer (fix).
+
+    By default the whole table is built in memory. The columns are then
+    all $DTYPE tags as they occur in the file (repeats included), and values of
+    a repeated reaction ID end up in all its rows.
+    With chunk_size, batches of chunk_size reactions are written one after the other,
+    so memory stays bounded. The columns come from the schema (each tag once),
+    every row holds the values of its own entry.
 
-                    # some mols might be empty, this if/else positions reagents/products accordingly
-                    if counter_reagents + 1 <= number_reagents:
-                        my_table.loc[rxn_id, my_table.columns[counter_reagents]] = (
-                            smiles
-                        )
-                        counter_reagents += 1
-                    else:
-                        my_table.loc[
-                            rxn_id,
-                            my_table.columns[counter_products + max_reagents],
-                        ] = smiles
-                        counter_products += 1
-
-                # reset variables
-                iterate_molecules = 0
-                molecule = []
-                mol_string = ""
-
-        previous_line = current_line
-    ################################
-
-    #
-    ######### GET single line data ##########
-    #
-
-    # Nota bene: this will write first line of multiline columns as well
-    # but doesn't matter since those will be correctly overwritten later on
-
-    rxn_id = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            # flag = 0
-            continue
-
-        if previous_line.startswith("$DTYPE") and current_line.startswith("$DATUM"):
-            current_column = previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-            row_text = current_line.replace("\n", " ")
-            # flag = 1
-            my_table.loc[rxn_id, current_column] = row_text.replace("$DATUM ", "")
-
-        previous_line = current_line
-    ################################
-
-    #
-    ### Extract Experimental Procedure ###
-    # Multiline, for all,
-    # Reaxys, Scifinder, Infochem
-    #
-
-    flag = 0
-    # 0 = generic
-    # 5 = exp procedure text over multiple lines
-    # 9 = skip
-    rxn_id = ""
-    multiple_row_text = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-        # get experimental section
-        if RDF_TYPE.upper() == "RXN:":
-            if re.match(".+EXP_PROC", previous_line) or flag == 5:
-                # start of the experimental section. spans over multiple line
-                if re.match(".+EXP_PROC", previous_line):
-                    current_column = (
-                        previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-                    )
+    Args:
+        rdf_records: parsed entries of a (fixed) RDF file
+        rdf_file_csv: resulting CSV file (incl. path)
+        smiles_workers: processes for the SMILES generation, default 1.
+            The molblocks are then sent in chunks to a process pool,
+            one for all batches.
+        smiles_cache: optional SmilesCache for repeated molblocks.
+        chunk_size: optional, number of reactions per batch.
+        schema: RdfSchema of the file, required with chunk_size or columnar output.
+        output_format: "csv" (default), "parquet" or "feather" (see arrow_output).
+            The columnar formats are always written in batches (row groups).
+            "sqlite" loads the records into the database rdf_file_csv, in batches
+            (see sqlite_output.py); "long" writes them as three tables named after
+            rdf_file_csv (see long_output.py). Neither needs a schema.
+        smiles_profile: "full" (default), "sanitize" or "raw", see molecules.py.
+        identifiers: add the InChIKey of each molecule column, the reaction SMILES
+            and the reaction hash (see identifier_columns); table outputs only.
+            The InChIKeys come from the molecules RDKit built for the SMILES.
+        source_file: the RDF file the records come from, for the sqlite output
+            (default rdf_file_csv).
+        stats: optional FileStats, gets the counters and the smiles/table/write times.
+        pool: optional process pool of smiles_pool(smiles_workers), e.g. for
+            several files; by default one is started for the records.
+    Returns:
+        None - output is the new file.
+    """
 
-                if re.match(".+NOTES", current_line) or re.match(
-                    ".+REFERENCE.+", current_line
-                ):
-                    # this is the end of experimental block
-                    flag = 9
-                    my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                        "$DATUM ", ""
-                    )
-                    multiple_row_text = ""
-                else:
-                    multiple_row_text += current_line.replace("\n", " ")
-                    flag = 5
-        else:  # Reaxys
-            if re.match(".+TXT", previous_line) or flag == 5:
-                # start of the experimental section. spans over multiple line
-                if re.match(".+TXT", previous_line):
-                    current_column = (
-                        previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if smiles_profile not in SMILES_PROFILES:
+        raise ValueError(f"Unknown SMILES profile: {smiles_profile}")
+    if output_format != "csv" and chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if identifiers and output_format in ("sqlite", "long"):
+        raise ValueError(
+            "The identifiers are columns of the csv/Parquet/Feather table."
+        )
+    if pool is None and smiles_workers > 1:
+        # one process pool for all batches
+        with smiles_pool(smiles_workers) as pool:
+            return csv_from_records(
+                rdf_records,
+                rdf_file_csv,
+                smiles_workers,
+                smiles_cache,
+                chunk_size,
+                schema,
+                output_format,
+                smiles_profile,
+                identifiers,
+                source_file,
+                stats,
+                pool,
+            )
+
+    if output_format in ("sqlite", "long"):
+        if output_format == "sqlite":
+            writer = SqliteWriter(rdf_file_csv, source_file or rdf_file_csv)
+        else:
+            writer = LongTableWriter(rdf_file_csv)
+        try:
+            for batch in _batched(rdf_records, chunk_size):
+                with stage(stats, "smiles"):
+                    batch_smiles = smiles_in_chunks(
+                        [mol for record in batch for mol in record.molecules],
+                        smiles_workers,
+                        smiles_cache=smiles_cache,
+                        profile=smiles_profile,
+                        pool=pool,
                     )
+                _count_molecules(stats, batch, batch_smiles)
+                with stage(stats, "write"):
+                    writer.write(batch, batch_smiles)
+            if output_format == "sqlite":
+                writer.finish()
+        finally:
+            writer.close()
+        if smiles_cache is not None:
+            print(smiles_cache)
+        return None
+
+    if chunk_size is not None:
+        if schema is None:
+            raise ValueError("Writing in chunks needs the schema of the file.")
+        # skip the copyright (optional)
+        columns_out = [c for c in schema.columns if "COPYRIGHT" not in c]
+        if identifiers:
+            columns_out = identifier_columns(
+                columns_out, schema.max_reagents + schema.max_products
+            )
+        batches = _converted_batches(
+            rdf_records,
+            chunk_size,
+            schema,
+            smiles_workers,
+            smiles_cache,
+            smiles_profile,
+            stats,
+            identifiers,
+            pool,
+        )
+        if output_format == "csv":
+            with open_text(rdf_file_csv, "w", newline="") as file_out:
+                header = True
+                for ids, rows in batches:
+                    with stage(stats, "table"):
+                        my_table = table_from_rows(ids, rows, columns_out)
+                    with stage(stats, "write"):
+                        my_table.to_csv(file_out, sep="\t", header=header, index=True)
+                    header = False
+                if header:  # no entries at all, header only
+                    table_from_rows([], [], columns_out).to_csv(file_out, sep="\t")
+        else:
+            writer = ArrowTableWriter(rdf_file_csv, columns_out, output_format)
+            try:
+                for ids, rows in batches:
+                    with stage(stats, "write"):
+                        writer.write(ids, rows)
+            finally:
+                writer.close()
+        if smiles_cache is not None:
+            print(smiles_cache)
+        return None
 
-                if re.match(".+STP", current_line):
-                    # this is the end of experimental block
-                    flag = 9
-                    my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                        "$DATUM ", ""
-                    )
-                    multiple_row_text = ""
-                else:
-                    multiple_row_text += current_line.replace("\n", " ")
-                    flag = 5
-
-        previous_line = current_line
-    ################################
-
-    #
-    ######## Extract Notes ########
-    # (only Scifinder)
-    #
-
-    flag = 0
-    # 0 = generic
-    # 6 = notes, text potentially over multiple lines
-    # 9 = skip
-
-    rxn_id = ""
-    multiple_row_text = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-            # Get Notes
-        if re.match(".+NOTES", previous_line) or flag == 6:
-            flag = 6
-            # start of the Notes section. might span over multiple line
-            if re.match(".+NOTES", previous_line):
-                current_column = (
-                    previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-                )
+    ##############################################################
+    # Single pass over the entries; source detection happens on the fly
+    records = list(rdf_records)
+    # get columns according to files specs. get max no of reagents at the same time.
+    columns, max_reagents = table_columns(records)
+
+    with stage(stats, "smiles"):
+        all_smiles, all_inchikeys = _convert_molecules(
+            records, smiles_workers, smiles_cache, smiles_profile, identifiers, pool
+        )
+    _count_molecules(stats, records, all_smiles)
+    if smiles_cache is not None:
+        print(smiles_cache)
+
+    # values are collected per reaction ID
+    # (values of a repeated ID end up in all its rows, last one wins)
+    with stage(stats, "table"):
+        rows_by_id: Dict[str, Dict[str, str]] = {}
+        for record, row in zip(
+            records,
+            rows_from_records(
+                records, columns, max_reagents, all_smiles, all_inchikeys
+            ),
+        ):
+            rows_by_id.setdefault(record.rxn_id, {}).update(row)
+
+        ############################################
+        # Build the table in one go and export to csv file format
+
+        # skip the copyright (optional)
+        columns = [column for column in columns if "COPYRIGHT" not in column]
+        if identifiers:
+            max_products = max(
+                [record.number_products for record in records], default=0
+            )
+            columns = identifier_columns(columns, max_reagents + max_products)
+        ids = [record.rxn_id for record in records]
+        rows = [rows_by_id[rxn_id] for rxn_id in ids]
+        my_table = table_from_rows(ids, rows, columns)
+    with stage(stats, "write"):
+        my_table.to_csv(
+            rdf_file_csv, sep="\t", header=True, index=True, encoding="utf-8"
+        )
 
-            if current_line.startswith("$DTYPE"):
-                # this is the end of Notes block
-                flag = 9
-                my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                    "$DATUM ", ""
-                )
-                multiple_row_text = ""
-            else:
-                multiple_row_text += current_line.replace("\n", " ")
-                flag = 6
-
-        previous_line = current_line
-    ################################
-
-    #
-    ######## Extract title ########
-    # (only Scifinder)
-    #
-
-    flag = 0
-    # 0 = generic
-    # 7 = title
-    # 9 = skip
-
-    rxn_id = ""
-    multiple_row_text = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-            # Get Title
-        if re.match(".+TITLE", previous_line) or flag == 7:
-            flag = 7
-            # start of the Title section. might span over multiple line
-            if re.match(".+TITLE", previous_line):
-                current_column = (
-                    previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-                )
+    # end of script
+    # one could add a return value for better error handling.
+    return None
 
-            if current_line.startswith("$DTYPE"):
-                # this is the end of title block
-                flag = 9
-                my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                    "$DATUM ", ""
-                )
-                multiple_row_text = ""
-            else:
-                multiple_row_text += current_line.replace("\n", " ")
-                flag = 7
-
-        previous_line = current_line
-    ################################
-
-    #
-    ####### Extract authors ########
-    # (only Scifinder)
-    #
-
-    flag = 0
-    # 0 = generic
-    # 8 = authors
-    # 9 = skip
-
-    rxn_id = ""
-    multiple_row_text = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-            # Get Authors
-        if re.match(".+AUTHOR", previous_line) or flag == 8:
-            flag = 8
-            if re.match(".+AUTHOR", previous_line):
-                current_column = (
-                    previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-                )
 
-            if current_line.startswith("$DTYPE"):
-                # this is the end of author block
-                flag = 9
-                my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                    "$DATUM ", ""
-                )
-                multiple_row_text = ""
-            else:
-                multiple_row_text += current_line.replace("\n", " ")
-                flag = 8
-
-        previous_line = current_line
-    ################################
-
-    #
-    ### Extract citation (i.e. source) ###
-    #
-    # This is done last, since for Scifinder
-    # this is the last entry in a file
-    # not necessary for reaxys, but it will go through it anyway
-    # (less ifs and doesn't screw anything up)
-    #
-
-    flag = 0
-    # 0 = generic
-    # 9 = skip
-    # 4 = citation
-
-    rxn_id = ""
-    multiple_row_text = ""
-    previous_line = seed_line
-
-    for line in open(rdf_file_ok, encoding="utf-8"):
-        current_line = line
-
-        # get reaction ID
-        if current_line.startswith("$RFMT"):
-            rxn_id = str(current_line.strip().split(" ")[2])
-            flag = 0
-            continue
-
-            # Get Citation
-        if re.match(".+CITATION", previous_line) or flag == 4:
-            flag = 4
-            if re.match(".+CITATION", previous_line):
-                current_column = (
-                    previous_line.strip().split(" ")[1].replace(RDF_TYPE, "")
-                )
+def _count_molecules(
+    stats: Optional[FileStats],
+    records: List[RdfRecord],
+    all_smiles: List[Optional[str]],
+) -> None:
+    """Reactions, (non empty) molecules and RDKit failures, for the metrics."""
+    if stats is None:
+        return None
+    stats.reactions += len(records)
+    stats.molecules += sum(1 for smiles in all_smiles if smiles != "")
+    stats.rdkit_failures += all_smiles.count(None)
 
-            if current_line.startswith("$DTYPE"):
-                # this is the end of citation block
-                flag = 9
-                my_table.loc[rxn_id, current_column] = multiple_row_text.replace(
-                    "$DATUM ", ""
-                )
-                multiple_row_text = ""
-            else:
-                multiple_row_text += current_line.replace("\n", " ")
-                flag = 4
 
-        previous_line = current_line
-    ################################
+def table_columns(records: List[RdfRecord]) -> Tuple[List[str], int]:
+    """
+    Determines the number of reagents, products, and the column names
+    from the records.
+
+    Args:
+        records: the parsed entries of the corrected RDF file.
+
+    Returns:
+        columns (list): all column names, in order (can contain duplicates)
+        max_reagents (int): number for later positioning of reagents smiles in table
+    """
 
-    # End of file scanning #
+    # Determine max no of reagents/products
+    max_reagents = max([record.number_reagents for record in records], default=0)
+    max_products = max([record.number_products for record in records], default=0)
 
-    ############################################
-    # Finish table for export to csv file format
+    # Build the column headers
+    columns = [f"Reagent{i}" for i in range(max_reagents)]
+    columns += [f"Product{i}" for i in range(max_products)]
+    for record in records:
+        columns += record.columns
 
-    my_table = my_table.replace(np.nan, "", regex=True)  # need to remove NaN
-    my_table.drop(
-        list(my_table.filter(regex="COPYRIGHT")), axis=1, inplace=True
-    )  # skip the copyright (optional)
-    my_table.to_csv(rdf_file_csv, sep="\t", header=True, index=True, encoding="utf-8")
+    return columns, max_reagents
 
-    # end of script
-    # one could add a return value for better error handling.
-    return None
+
+def rows_from_records(
+    records: List[RdfRecord],
+    columns: List[str],
+    max_reagents: int,
+    all_smiles: List[Optional[str]],
+    all_inchikeys: Optional[List[Optional[str]]] = None,
+) -> List[Dict[str, str]]:
+    """Table row (column -> value) per entry.
+
+    Args:
+        records: parsed entries
+        columns: the table columns, used for positioning the molecules
+        max_reagents: number of reagent columns
+        all_smiles: smiles_from_molblock results for all molecules of the records, in order
+        all_inchikeys: optional, the InChIKeys of the same molecules; then the
+            identifier columns are filled too (see identifier_columns). Reaction
+            SMILES and hash stay empty if a molecule couldn't be converted.
+    Returns:
+        one dict per record, same order.
+    """
+
+    rows = []
+    smiles_of_molecules = iter(all_smiles)
+    inchikeys_of_molecules = iter(all_inchikeys or [])
+    for record in records:
+        row: Dict[str, str] = {}
+
+        #
+        ############### GET MOLECULES #############
+        # (structure same for Reaxys and Scifinder - and Infochem(?))
+        #
+        counter_reagents = 0
+        counter_products = 0
+        # SMILES and InChIKeys of the reagents [0] and products [1]
+        reaction_smiles: Tuple[List[str], List[str]] = ([], [])
+        reaction_inchikeys: Tuple[List, List] = ([], [])
+        complete = True
+        for _ in record.molecules:
+            smiles = next(smiles_of_molecules)
+            inchikey = next(inchikeys_of_molecules, None)
+            if smiles is None:
+                complete = False
+                continue
+
+            # some mols might be empty, this if/else positions reagents/products accordingly
+            if counter_reagents + 1 <= record.number_reagents:
+                column = columns[counter_reagents]
+                counter_reagents += 1
+                role = 0
+            else:
+                column = columns[counter_products + max_reagents]
+                counter_products += 1
+                role = 1
+            row[column] = smiles
+            if all_inchikeys is not None:
+                row[column + "_InChIKey"] = inchikey or ""
+                if smiles != "":
+                    reaction_smiles[role].append(smiles)
+                    reaction_inchikeys[role].append(inchikey)
+
+        if all_inchikeys is not None and complete:
+            row["ReactionSmiles"] = ">>".join(".".join(s) for s in reaction_smiles)
+            row["ReactionHash"] = reaction_hash(*reaction_inchikeys)
+
+        #
+        ######### GET data fields ##########
+        # single line and multiline (experimental procedure, notes,
+        # title, authors, citation) are already resolved by the parser
+        #
+        row.update(record.fields)
+        rows.append(row)
+
+    return rows
+
+
+def table_from_rows(
+    ids: List[str], rows: List[Dict[str, str]], columns: List[str]
+) -> "pd.DataFrame":
+    """Builds the output table at once from column lists, instead of cell by cell.
+
+    Args:
+        ids: row index, in file order (can contain duplicates)
+        rows: values per row, column -> value
+        columns: column names (can contain duplicates, they get the same values)
+    Returns:
+        pandas DataFrame, empty cells are "".
+    """
+    import pandas as pd
+
+    data = {
+        column: [row.get(column, "") for row in rows]
+        for column in dict.fromkeys(columns)
+    }
+    # positions as keys, since columns may repeat
+    table = pd.DataFrame(
+        {i: data[column] for i, column in enumerate(columns)}, index=ids, dtype=object
+    )
+    table.columns = columns
+    return table
+
+
+def _converted_batches(
+    rdf_records: Iterable[RdfRecord],
+    chunk_size: int,
+    schema: RdfSchema,
+    smiles_workers: int = 1,
+    smiles_cache: Optional[SmilesCache] = None,
+    smiles_profile: str = "full",
+    stats: Optional[FileStats] = None,
+    identifiers=False,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Iterator[Tuple[List[str], List[Dict[str, str]]]]:
+    """Converts the records batch by batch (all with the same process pool, if any).
+
+    Yields:
+        (reaction IDs, table rows) per batch of chunk_size entries.
+    """
+    for batch in _batched(rdf_records, chunk_size):
+        with stage(stats, "smiles"):
+            batch_smiles, batch_inchikeys = _convert_molecules(
+                batch, smiles_workers, smiles_cache, smiles_profile, identifiers, pool
+            )
+        _count_molecules(stats, batch, batch_smiles)
+        with stage(stats, "table"):
+            rows = rows_from_records(
+                batch,
+                schema.columns,
+                schema.max_reagents,
+                batch_smiles,
+                batch_inchikeys,
+            )
+        yield [record.rxn_id for record in batch], rows
+
+
+def _batched(records: Iterable[RdfRecord], size: int) -> Iterator[List[RdfRecord]]:
+    """Groups the (streamed) records into lists of size entries."""
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, size))
+        if not batch:
+            return
+        yield batch
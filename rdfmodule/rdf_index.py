@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Byte offset index for random access into (fixed) RDF files.
+build_index writes a sidecar file "<rdf file>.idx" with the ID, byte offset and
+length of each $RFMT entry; RdfIndex then returns single entries via mmap,
+without scanning the file again.
+
+Example:
+    from rdfmodule.rdf_index import RdfIndex
+    with RdfIndex("reaxys_export_fixed.rdf") as index:
+        record = index.record("28100547")
+        print(record.fields, index.smiles("28100547"))
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import mmap
+import os
+from typing import Dict, List, Optional, Tuple
+
+from rdfmodule.rdf_parser import (
+    RdfRecord,
+    detect_rdf_type,
+    parse_buffer,
+    strip_compression,
+)
+
+INDEX_EXTENSION = ".idx"
+INDEX_HEADER = "# rdf_fixer index"
+
+
+def _source_stamp(rdf_file: str) -> Tuple[int, int]:
+    stat = os.stat(rdf_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(rdf_file: str, index_file: Optional[str] = None) -> str:
+    """Scans an RDF file for its $RFMT entries and writes the sidecar index.
+
+    Meant for fixed RDF files: every $RFMT line needs an ID.
+    Compressed files can't be indexed (no byte offsets to jump to).
+
+    Args:
+        rdf_file: the (fixed) RDF file
+        index_file: optional name of the index, default is rdf_file + ".idx"
+    Returns:
+        name of the index file.
+    """
+
+    if strip_compression(rdf_file) != rdf_file:
+        raise ValueError(f"Compressed files can't be indexed: {rdf_file}")
+
+    if index_file is None:
+        index_file = rdf_file + INDEX_EXTENSION
+
+    rdf_type = ""
+    entries: List[Tuple[str, int, int]] = []
+    with open(rdf_file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # the source (Scifinder, Reaxys...) as the parser would detect it
+                rdf_type = detect_rdf_type(mm)[0] or ""
+                starts = [0] if mm[:5] == b"$RFMT" else []
+                position = mm.find(b"\n$RFMT")
+                while position != -1:
+                    starts.append(position + 1)
+                    position = mm.find(b"\n$RFMT", position + 1)
+                for i, start in enumerate(starts):
+                    end = starts[i + 1] if i + 1 < len(starts) else size
+                    line_end = mm.find(b"\n", start, end)
+                    line = mm[start : end if line_end == -1 else line_end]
+                    parts = line.decode("utf-8").strip().split(" ")
+                    if len(parts) < 3:
+                        raise ValueError(
+                            f"$RFMT without ID at byte {start}, index the fixed file."
+                        )
+                    entries.append((parts[2], start, end - start))
+
+    size, mtime_ns = _source_stamp(rdf_file)
+    with open(index_file, "w", encoding="utf-8") as f:
+        f.write(f"{INDEX_HEADER}\t{rdf_type}\t{size}\t{mtime_ns}\n")
+        for rxn_id, offset, length in entries:
+            f.write(f"{rxn_id}\t{offset}\t{length}\n")
+
+    return index_file
+
+
+class RdfIndex:
+    """
+    Random access to the entries of an RDF file via its sidecar index.
+    The index is (re)built if missing or older than the RDF file.
+    For repeated IDs, the first entry is returned (offsets() lists all).
+    """
+
+    def __init__(self, rdf_file: str, index_file: Optional[str] = None):
+        self.rdf_file = rdf_file
+        self.index_file = index_file or rdf_file + INDEX_EXTENSION
+        self.rdf_type = ""
+        self._offsets: Dict[str, List[Tuple[int, int]]] = {}
+        if not self._load():
+            build_index(rdf_file, self.index_file)
+            self._load()
+
+        self._file = open(rdf_file, "rb")
+        self._mm = None
+        if os.fstat(self._file.fileno()).st_size > 0:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load(self) -> bool:
+        """Reads the index, False if missing or stale."""
+        if not os.path.isfile(self.index_file):
+            return False
+        with open(self.index_file, encoding="utf-8") as f:
+            header = f.readline().rstrip("\n").split("\t")
+            if header[0] != INDEX_HEADER or len(header) != 4:
+                return False
+            if (int(header[2]), int(header[3])) != _source_stamp(self.rdf_file):
+                return False
+            self.rdf_type = header[1]
+            self._offsets = {}
+            for line in f:
+                rxn_id, offset, length = line.rstrip("\n").split("\t")
+                self._offsets.setdefault(rxn_id, []).append((int(offset), int(length)))
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, rxn_id: str) -> bool:
+        return rxn_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def ids(self) -> List[str]:
+        return list(self._offsets)
+
+    def offsets(self, rxn_id: str) -> List[Tuple[int, int]]:
+        """All (byte offset, length) of an ID."""
+        return self._offsets.get(rxn_id, [])
+
+    def record_text(self, rxn_id: str) -> str:
+        """The raw text of the entry, from its $RFMT line on. KeyError if unknown."""
+        offset, length = self._offsets[rxn_id][0]
+        raw = self._mm[offset : offset + length]
+        return raw.decode("utf-8").replace("\r\n", "\n")
+
+    def record(self, rxn_id: str) -> RdfRecord:
+        """The parsed entry (molblocks, data fields)."""
+        offset, length = self._offsets[rxn_id][0]
+        return next(parse_buffer(self._mm[offset : offset + length], self.rdf_type))
+
+    def smiles(self, rxn_id: str) -> List[Optional[str]]:
+        """SMILES of the molecules of the entry, reagents first (None if unreadable)."""
+        from rdfmodule.rdf_fixer import smiles_from_molblocks
+
+        return smiles_from_molblocks(self.record(rxn_id).molecules)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
@@ -0,0 +1,800 @@
+# -*- coding: utf-8 -*-
+"""
+Line fixing (as used by fix) and single pass RDF record parser.
+Walks a (fixed) RDF file once and yields one RdfRecord per $RFMT entry,
+containing the reaction ID, the molblocks and the data fields
+(single and multiline ones).
+Entries are split on the bytes level, at the (ASCII) markers; only molblocks and
+data fields are decoded. Files on disk are read via mmap (parse_buffer), original
+ones are fixed in blocks of whole entries (fixed_blocks).
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import bz2
+import gzip
+import itertools
+import lzma
+import mmap
+import os
+import re
+from enum import Enum
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class RdfSource(Enum):
+    UNKNOWN = ""
+    SCIFINDER = "RXN:"
+    INFOCHEM = "RXN:"
+    REAXYS = "ROOT:"
+
+
+PATTERN_SCIFINDER = re.compile(".+SCHEME")
+PATTERN_INFOCHEM = re.compile(".+Infochem|.+ACS")
+PATTERN_REAXYS = re.compile(".+Marvin")
+# the "  y  z" line of a reaction block: y reactants, z products.
+PATTERN_RXN_COUNTS = re.compile(r"\s\s[0-9]\s\s[0-9]\n")
+
+# the same on the bytes level, within an entry
+# a $DTYPE line (after a newline) with the $DATUM line following it, if any:
+# (rest of the $DTYPE line, $DATUM line, its newline)
+PATTERN_FIELD_BYTES = re.compile(rb"\n\$DTYPE([^\n]*)(?:\n(\$DATUM[^\n]*)(?=(\n?)))?")
+PATTERN_RXN_COUNTS_BYTES = re.compile(
+    rb"^[^\S\n][^\S\n]([0-9])[^\S\n][^\S\n]([0-9])\n", re.M
+)
+# the lines scan_schema looks at
+PATTERN_SCHEMA_LINES = re.compile(
+    rb"^(?:\$DTYPE[^\n]*|\$RXN[^\n]*|\$MOL\n|[^\S\n][^\S\n][0-9][^\S\n][^\S\n][0-9]\n)",
+    re.M,
+)
+
+# the line fixing rules of fixed_lines on the bytes level (see fixed_blocks),
+# all matching a line incl. the newline in front of it
+# empty lines after "M  END" (ICSynth), the last newline is that of the next line
+PATTERN_EMPTY_AFTER_END = re.compile(rb"(\nM  END[^\n]*)\n+(?=\n)")
+# repeated $RDFILE lines, the first kept
+PATTERN_REPEATED_RDFILE = re.compile(rb"(\n\$RDFILE[^\n]*)(?:\n\$RDFILE[^\n]*)+")
+# bare $RFMT (Spresi)
+PATTERN_BARE_RFMT = re.compile(rb"\$RFMT\n")
+# $RFMT line of an entry without molecule block
+PATTERN_EMPTY_ENTRY = re.compile(rb"\n\$RFMT[^\n]*(?=\n\$DTYPE)")
+# size of the blocks fixed_blocks reads and gives out (roughly)
+FIX_BLOCK_SIZE = 1 << 24
+
+# Multiline fields per source: (text in the $DTYPE tag, regex of the line ending the block).
+# A block runs from the line after its $DTYPE line up to (excl.) the end line;
+# blocks not ended within the entry are not written.
+# Order matters: where blocks of two fields end on the same line, the latter wins.
+# ICSynth and Spresi exports carry no hint of their source, they are read as UNKNOWN.
+NEXT_FIELD = r"\$DTYPE"
+_MULTILINE_COMMON = [
+    ("NOTES", NEXT_FIELD),
+    ("TITLE", NEXT_FIELD),
+    ("AUTHOR", NEXT_FIELD),
+    ("CITATION", NEXT_FIELD),
+]
+MULTILINE_FIELDS: Dict[str, List[Tuple[str, str]]] = {
+    # SciFinder (and Infochem): experimental procedure up to the notes or references
+    RdfSource.SCIFINDER.value: [("EXP_PROC", r".+NOTES|.+REFERENCE.+")]
+    + _MULTILINE_COMMON,
+    # Reaxys: procedure text up to the next step field
+    RdfSource.REAXYS.value: [("TXT", r".+STP")] + _MULTILINE_COMMON,
+    RdfSource.UNKNOWN.value: [("TXT", r".+STP")] + _MULTILINE_COMMON,
+}
+
+# compressed files are (de)compressed on the fly, by file extension
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".xz", ".zst")
+
+
+def open_text(file_name: str, mode: str = "r", newline: Optional[str] = None) -> IO:
+    """Opens a file as utf-8 text, compressed or not (see COMPRESSED_EXTENSIONS).
+
+    Args:
+        file_name: file to open, e.g. "export.rdf" or "export.rdf.gz"
+        mode: "r" or "w"
+        newline: as for open()
+    Returns:
+        text file object
+    """
+    text_mode = mode + "t"
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, text_mode, encoding="utf-8", newline=newline)
+    if file_name.endswith(".bz2"):
+        return bz2.open(file_name, text_mode, encoding="utf-8", newline=newline)
+    if file_name.endswith(".xz"):
+        return lzma.open(file_name, text_mode, encoding="utf-8", newline=newline)
+    if file_name.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as _e:
+            raise ImportError(
+                "zstd compressed files need zstandard: pip install zstandard"
+            ) from _e
+        return zstandard.open(file_name, text_mode, encoding="utf-8", newline=newline)
+
+    return open(file_name, mode, encoding="utf-8", newline=newline)
+
+
+def open_bytes(file_name: str, mode: str = "rb") -> IO:
+    """Opens a file for reading (or writing: mode "wb") bytes, compressed or not
+    (see COMPRESSED_EXTENSIONS)."""
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, mode)
+    if file_name.endswith(".bz2"):
+        return bz2.open(file_name, mode)
+    if file_name.endswith(".xz"):
+        return lzma.open(file_name, mode)
+    if file_name.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as _e:
+            raise ImportError(
+                "zstd compressed files need zstandard: pip install zstandard"
+            ) from _e
+        return zstandard.open(file_name, mode)
+
+    return open(file_name, mode)
+
+
+def strip_compression(file_name: str) -> str:
+    """File name without a compression extension (if any)."""
+    for extension in COMPRESSED_EXTENSIONS:
+        if file_name.endswith(extension):
+            return file_name[: -len(extension)]
+    return file_name
+
+
+class RdfRecord:
+    """
+    One reaction entry ($RFMT) of an RDF file.
+    molecules: molblock strings, reagents first; "" for missing ones.
+    columns: all $DTYPE column names in file order (can contain duplicates).
+    fields: column -> value, multiline values override their first line.
+    """
+
+    def __init__(self, rxn_id: str):
+        self.rxn_id = rxn_id
+        self.number_reagents = 0
+        self.number_products = 0
+        self.molecules: List[str] = []
+        self.columns: List[str] = []
+        self.fields: Dict[str, str] = {}
+
+
+def rdf_vendor_of_line(line: str) -> Optional[str]:
+    """
+    Checks a single line for a hint of the RDF source, as rdf_origin_of_line.
+
+    Returns:
+        name of the RdfSource ("SCIFINDER", "INFOCHEM" or "REAXYS"),
+        None if nothing found in this line. INFOCHEM shares its value with
+        SCIFINDER (an alias in RdfSource), its name is only known from here.
+    """
+    if PATTERN_SCIFINDER.match(line) and PATTERN_INFOCHEM.match(line):
+        return "INFOCHEM"
+    elif PATTERN_SCIFINDER.match(line) and PATTERN_INFOCHEM.search(line) is None:
+        return "SCIFINDER"
+    elif PATTERN_REAXYS.match(line):
+        return "REAXYS"
+
+    return None
+
+
+def rdf_origin_of_line(line: str) -> Optional[str]:
+    """
+    Checks a single line for a hint of the RDF source.
+
+    Returns:
+        RdfSource value (the string used for the column name replacements),
+        None if nothing found in this line.
+    """
+    vendor = rdf_vendor_of_line(line)
+    return None if vendor is None else RdfSource[vendor].value
+
+
+class FieldTable:
+    """
+    The multiline fields of a source (see MULTILINE_FIELDS), compiled once.
+    starts finds the $DTYPE lines of all of these fields in one search,
+    keys tell which field(s) a found line belongs to,
+    ends are the end line patterns per field.
+    All patterns match a line incl. the newline in front of it, so they are anchored
+    at the line start without scanning in multiline mode.
+    """
+
+    def __init__(self, fields: List[Tuple[str, str]]):
+        self.keys = [key.encode("utf-8") for key, _ in fields]
+        any_key = b"|".join(re.escape(key) for key in self.keys)
+        self.starts = re.compile(rb"\n\$DTYPE[^\n]*(?:" + any_key + rb")")
+        self.ends = [
+            re.compile(rb"\n(?:" + end.encode("utf-8") + rb")") for _, end in fields
+        ]
+
+
+def field_table(rdf_type: str) -> FieldTable:
+    """The compiled multiline fields of a source (RdfSource value), once per process.
+    Sources without an own entry are read as UNKNOWN."""
+    if rdf_type not in _field_tables:
+        fields = MULTILINE_FIELDS.get(
+            rdf_type.upper(), MULTILINE_FIELDS[RdfSource.UNKNOWN.value]
+        )
+        _field_tables[rdf_type] = FieldTable(fields)
+
+    return _field_tables[rdf_type]
+
+
+_field_tables: Dict[str, FieldTable] = {}
+
+
+def _find_line(buffer: bytes, marker: bytes, start: int = 0) -> int:
+    """Start of the first line (from start on, a line start) beginning with marker.
+
+    Returns:
+        byte offset, -1 if there is none.
+    """
+    if buffer.startswith(marker, start):
+        return start
+    found = buffer.find(b"\n" + marker, start)
+    return -1 if found == -1 else found + 1
+
+
+def _fill_record(record: RdfRecord, body: bytes, rdf_type: str) -> None:
+    """
+    Splits one $RFMT entry (its bytes after the $RFMT line) into molecules and data fields.
+    Works on the markers, only molblocks and data fields are decoded.
+    """
+    data_start = _find_line(body, b"$DTYPE")
+    if data_start == -1:
+        data_start = len(body)
+    _fill_molecules(record, body[:data_start])
+    _fill_fields(record, body[data_start:], rdf_type)
+
+
+def _fill_molecules(record: RdfRecord, block: bytes) -> None:
+    """
+    The molecules of one entry, from the part before the data fields.
+    The "  y  z" lines between $RXN and the first $MOL line give the numbers,
+    then each molecule runs up to (and incl.) its "M  END" line.
+    """
+
+    rxn = _find_line(block, b"$RXN")
+    first_mol = _find_line(block, b"$MOL\n")
+    mol_start = len(block) if first_mol == -1 else first_mol
+    number_lists = 0
+    number_molecules = 0
+    if rxn != -1 and rxn < mol_start:
+        for counts in PATTERN_RXN_COUNTS_BYTES.finditer(block, rxn, mol_start):
+            record.number_reagents = int(counts.group(1))
+            record.number_products = int(counts.group(2))
+            number_molecules = record.number_reagents + record.number_products
+            number_lists += number_molecules
+
+    molecule = [b""] * number_lists
+    if first_mol != -1 and number_molecules > 0:
+        # all lines after the first $MOL line, without the $MOL lines
+        text = b"\n" + block[first_mol + len(b"$MOL\n") :]
+        while b"\n$MOL\n" in text:
+            text = text.replace(b"\n$MOL\n", b"\n")
+        text = text[1:]
+        iterate_molecules = 0
+        position = 0
+        end = _find_line(text, b"M  END\n")
+        while end != -1 and iterate_molecules < number_molecules:
+            molecule[iterate_molecules] = text[position : end + len(b"M  END\n")]
+            position = end + len(b"M  END\n")
+            iterate_molecules += 1
+            end = _find_line(text, b"M  END\n", position)
+        if iterate_molecules < number_molecules:
+            # last molecule without "M  END"
+            molecule[iterate_molecules] = text[position:]
+    record.molecules = [mol.decode("utf-8") for mol in molecule]
+
+
+def _fill_fields(record: RdfRecord, data: bytes, rdf_type: str) -> None:
+    """
+    The data fields of one entry, from its first $DTYPE line on.
+    Single line values are the $DATUM line right after the $DTYPE line;
+    multiline values (see MULTILINE_FIELDS) override them.
+    """
+
+    def column_of(dtype_line: str) -> str:
+        return dtype_line.strip().split(" ")[1].replace(rdf_type, "")
+
+    # with a newline in front, every $DTYPE line starts with "\n$DTYPE"
+    data = b"\n" + data
+    fields = PATTERN_FIELD_BYTES.findall(data)
+    record.columns = [column_of("$DTYPE" + tag.decode("utf-8")) for tag, _, _ in fields]
+    single: Dict[str, str] = {}
+    for column, (_, value, line_end) in zip(record.columns, fields):
+        if value:
+            value = (value + line_end).replace(b"\n", b" ").replace(b"$DATUM ", b"")
+            single[column] = value.decode("utf-8")
+
+    # (end of block, field no, column, start of block); blocks without end are not written
+    table = field_table(rdf_type)
+    field_starts: List[List[int]] = [[] for _ in table.keys]
+    for found in table.starts.finditer(data):
+        line_end = data.find(b"\n", found.end())
+        if line_end == -1:
+            line_end = len(data)
+        line = data[found.start() + len(b"\n$DTYPE") : line_end]
+        for number, key in enumerate(table.keys):
+            if key in line:
+                field_starts[number].append(found.start() + 1)
+    blocks = []
+    for number, starts in enumerate(field_starts):
+        pattern_end = table.ends[number]
+        i = 0
+        while i < len(starts):
+            block_start = data.find(b"\n", starts[i]) + 1
+            if block_start == 0:
+                break
+            found = pattern_end.search(data, block_start - 1)
+            if found is None:
+                break
+            block_end = found.start() + 1
+            # a repeated start within the block only changes the column
+            while i + 1 < len(starts) and starts[i + 1] < block_end:
+                i += 1
+            blocks.append((block_end, number, starts[i], block_start))
+            # a new block starts after its end line at the earliest
+            while i < len(starts) and starts[i] < block_end:
+                i += 1
+    multi: Dict[str, str] = {}
+    for block_end, _, field_start, block_start in sorted(blocks):
+        dtype_line = data[field_start : data.find(b"\n", field_start)].decode("utf-8")
+        text = data[block_start:block_end].replace(b"\n", b" ")
+        multi[column_of(dtype_line)] = text.replace(b"$DATUM ", b"").decode("utf-8")
+
+    single.update(multi)
+    record.fields = single
+
+
+def detect_rdf_vendor(buffer: bytes) -> Tuple[Optional[str], int]:
+    """The source of an RDF file in a buffer by name, as rdf_vendor_of_line on the
+    first line giving it away (one with "SCHEME" or "Marvin" in it).
+
+    Returns:
+        (RdfSource name or None, byte offset of that line), offset -1 if not found.
+    """
+    line_start = -1
+    for hint in (b"SCHEME", b"Marvin"):
+        position = buffer.find(hint)
+        # .+ in front, not at the start of a line
+        while position == 0 or (position > 0 and buffer[position - 1] == 10):
+            position = buffer.find(hint, position + 1)
+        if position != -1:
+            start = buffer.rfind(b"\n", 0, position) + 1
+            if line_start == -1 or start < line_start:
+                line_start = start
+    if line_start == -1:
+        return None, -1
+    line_end = buffer.find(b"\n", line_start)
+    line = buffer[line_start : len(buffer) if line_end == -1 else line_end]
+    return rdf_vendor_of_line(line.decode("utf-8", errors="replace")), line_start
+
+
+def detect_rdf_type(buffer: bytes) -> Tuple[Optional[str], int]:
+    """The source (RdfSource value) of an RDF file in a buffer, see detect_rdf_vendor.
+
+    Returns:
+        (RdfSource value or None, byte offset of that line), offset -1 if not found.
+    """
+    vendor, line_start = detect_rdf_vendor(buffer)
+    return (None if vendor is None else RdfSource[vendor].value), line_start
+
+
+def detect_file_type(rdf_file: str) -> str:
+    """The source (RdfSource value) of an RDF file, from the first line in the whole
+    file giving it away (see detect_rdf_type), as rdf_origin did before parsing.
+    Works on the bytes: uncompressed files via mmap, compressed ones blockwise.
+
+    Args:
+        rdf_file: (original or fixed) RDF file, can be compressed
+    Returns:
+        RdfSource value, that of UNKNOWN if the file has no hint.
+    """
+    unknown = RdfSource.UNKNOWN.value
+    if strip_compression(rdf_file) == rdf_file:
+        with open(rdf_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return unknown
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return detect_rdf_type(mm)[0] or unknown
+
+    rest = b""
+    with open_bytes(rdf_file) as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            # whole lines only, the rest goes with the next block
+            buffer = rest + block
+            cut = buffer.rfind(b"\n") + 1
+            buffer, rest = buffer[:cut], buffer[cut:]
+            rdf_type, found_at = detect_rdf_type(buffer)
+            if found_at != -1:
+                return rdf_type or unknown
+    return detect_rdf_type(rest)[0] or unknown
+
+
+def parse_buffer(buffer: bytes, rdf_type: Optional[str] = None) -> Iterator[RdfRecord]:
+    """Parses (fixed) RDF content on the bytes level, see parse_records.
+
+    Entries are cut at the $RFMT lines, lines outside of molblocks and data
+    fields are never decoded.
+
+    Args:
+        buffer: bytes or mmap of (a part of) an RDF file
+        rdf_type: RdfSource value if already known, then no detection is done;
+            else the whole buffer is looked at first (see detect_rdf_type).
+    Yields:
+        RdfRecord per $RFMT entry, in file order.
+    """
+
+    if buffer.find(b"\r") != -1:
+        # as universal newlines on text files
+        buffer = bytes(buffer).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+    if rdf_type is None:
+        rdf_type = detect_rdf_type(buffer)[0]
+    if rdf_type is None:
+        rdf_type = RdfSource.UNKNOWN.value
+
+    starts = [0] if buffer[:5] == b"$RFMT" else []
+    position = buffer.find(b"\n$RFMT")
+    while position != -1:
+        starts.append(position + 1)
+        position = buffer.find(b"\n$RFMT", position + 1)
+    starts.append(len(buffer))
+
+    for start, end in zip(starts, starts[1:]):
+        line_end = buffer.find(b"\n", start, end)
+        body_start = end if line_end == -1 else line_end + 1
+        rfmt_line = buffer[start:body_start].decode("utf-8")
+        record = RdfRecord(str(rfmt_line.strip().split(" ")[2]))
+        _fill_record(record, buffer[body_start:end], rdf_type)
+        yield record
+
+
+class RdfSchema:
+    """
+    Table layout of an RDF file, from a cheap scan (see scan_schema).
+    columns: Reagent/Product columns, then each $DTYPE column name once, in order of appearance.
+    """
+
+    def __init__(self, max_reagents: int, max_products: int, columns: List[str]):
+        self.max_reagents = max_reagents
+        self.max_products = max_products
+        self.columns = columns
+
+
+def scan_schema(lines: Iterable[str], rdf_type: Optional[str] = None) -> RdfSchema:
+    """Scans (fixed) RDF lines for the table layout only.
+
+    No molblocks or data values are collected: only the "  y  z" lines
+    (max no of reagents/products) and the $DTYPE tags.
+
+    Args:
+        lines: lines of a fixed RDF file, e.g. an open file or fixed_lines()
+        rdf_type: RdfSource value of the file (see detect_file_type), for the
+            column names of the tags before the first line giving the source away.
+            Else detected on the fly.
+    Returns:
+        RdfSchema
+    """
+
+    in_rxn = False
+    max_reagents = 0
+    max_products = 0
+    tags: Dict[str, None] = {}
+    for line in lines:
+        if rdf_type is None:
+            rdf_type = rdf_origin_of_line(line)
+
+        if line.startswith("$DTYPE"):
+            tag = line.strip().split(" ")[1].replace(rdf_type or "", "")
+            tags[tag] = None
+        elif line.startswith("$RXN"):
+            in_rxn = True
+        elif line == "$MOL\n":
+            in_rxn = False
+        elif in_rxn and PATTERN_RXN_COUNTS.match(line):
+            x = line.strip().split("  ")
+            max_reagents = max(max_reagents, int(x[0]))
+            max_products = max(max_products, int(x[1]))
+
+    columns = [f"Reagent{i}" for i in range(max_reagents)]
+    columns += [f"Product{i}" for i in range(max_products)]
+    columns += list(tags)
+    return RdfSchema(max_reagents, max_products, columns)
+
+
+def fixed_lines(rdf_file_in: str, numbered: Optional[Set[str]] = None) -> Iterator[str]:
+    """The line fixing rules of fix(), as a stream of corrected lines.
+
+    Removes the $RFMT line of entries without molecule block,
+    the surplus empty line after "M  END" (ICSynth), uses upper case "RXN:"
+    and numbers bare $RFMT lines (Spresi).
+
+    Args:
+        rdf_file_in: original RDF file (can be compressed)
+        numbered: optional, collects the IDs given to bare $RFMT lines
+            (line numbers, i.e. not unique across files), as they are yielded.
+    Yields:
+        the lines of the fixed RDF file
+    """
+
+    with open_text(rdf_file_in) as file_in:
+        seed_line = file_in.readline()
+        previous_line = seed_line  # get first line as "seed" for upcoming loop
+        counter = 0  # in case one needs to change entry enumeration
+        for current_line in itertools.chain([seed_line], file_in):
+            # prevent first line from being written twice
+            if current_line.startswith("$RDFILE") and previous_line.startswith(
+                "$RDFILE"
+            ):
+                continue
+
+            # empty molecule block
+            write_to_file = not (
+                current_line.startswith("$DTYPE") and previous_line.startswith("$RFMT")
+            )
+
+            # here a correction for ICSynth RDFs that have one empty row to many
+            if current_line == "\n" and previous_line.startswith("M  END"):
+                continue
+
+            # old entries use lower case rxn. Change to upper case. faster without if check.
+            previous_line = previous_line.replace("rxn:", "RXN:")
+
+            # here a correction for (old) Spresi Rdfs (also Marvin???)
+            # else a csv conversion won't work without extensive changes
+            if numbered is not None and previous_line == "$RFMT\n":
+                numbered.add(str(counter))
+            previous_line = previous_line.replace(
+                "$RFMT\n", ("$RFMT $RIREG " + str(counter) + "\n")
+            )
+            counter += 1
+
+            if write_to_file:
+                yield previous_line
+
+            previous_line = current_line
+
+        yield previous_line
+        # the last line is not caught in the loop, hence given out here.
+
+
+def _entry_cut(buffer: bytes) -> int:
+    """Start of the last $RFMT line in buffer at which the fixed content can be cut
+    into whole entries: its next line complete and not a $DTYPE line (which would
+    drop it, see fixed_lines). -1 if there is none."""
+    end = len(buffer)
+    while True:
+        position = buffer.rfind(b"\n$RFMT", 0, end)
+        if position == -1:
+            return -1
+        line_end = buffer.find(b"\n", position + 1)
+        if (
+            line_end != -1
+            and buffer.find(b"\n", line_end + 1) != -1
+            and not buffer.startswith(b"$DTYPE", line_end + 1)
+        ):
+            return position + 1
+        end = position
+
+
+def _first_rdfile(match: re.Match) -> bytes:
+    """The first of repeated $RDFILE lines, with the newline of the last one at the
+    end of the file (which has none)."""
+    if match.end() == len(match.string):
+        return match.group(1) + b"\n"
+    return match.group(1)
+
+
+def _fix_piece(
+    piece: bytes, counter: int, last: bool, numbered: Optional[Set[str]]
+) -> Tuple[bytes, int]:
+    """Applies the rules of fixed_lines to whole lines of an RDF file.
+
+    Args:
+        piece: whole entries (or the start of the file incl. the seed line)
+        counter: the line counter of fixed_lines at the start of piece
+        last: piece ends the file, its last line is given out unchanged
+        numbered: see fixed_lines
+    Returns:
+        the fixed bytes, the counter at the end of piece
+    """
+
+    # lines skipped by fixed_lines do not count, they go first
+    piece = PATTERN_EMPTY_AFTER_END.sub(rb"\1", b"\n" + piece)
+    piece = PATTERN_REPEATED_RDFILE.sub(_first_rdfile, piece)[1:]
+    head, tail = piece, b""
+    if last:
+        last_line = piece.rfind(b"\n", 0, len(piece) - 1) + 1
+        head, tail = piece[:last_line], piece[last_line:]
+
+    head = head.replace(b"rxn:", b"RXN:")
+    if head.find(b"$RFMT\n") != -1:
+        original = head
+        lines = [0, counter]  # position, lines before it
+
+        def number(match: re.Match) -> bytes:
+            lines[1] += original.count(b"\n", lines[0], match.start())
+            lines[0] = match.start()
+            if numbered is not None and (
+                match.start() == 0 or original[match.start() - 1] == 10
+            ):
+                numbered.add(str(lines[1]))
+            return b"$RFMT $RIREG " + str(lines[1]).encode("utf-8") + b"\n"
+
+        head = PATTERN_BARE_RFMT.sub(number, original)
+
+    counter += piece.count(b"\n")
+    piece = PATTERN_EMPTY_ENTRY.sub(b"", b"\n" + head + tail)[1:]
+    return piece, counter
+
+
+def fixed_blocks(
+    rdf_file_in: str, numbered: Optional[Set[str]] = None
+) -> Iterator[bytes]:
+    """The line fixing rules of fix() on the bytes level, see fixed_lines.
+
+    Same output, without decoding: the file is read and fixed in blocks of
+    about FIX_BLOCK_SIZE, cut at the start of an entry ($RFMT line).
+
+    Args:
+        rdf_file_in: original RDF file (can be compressed)
+        numbered: as for fixed_lines
+    Yields:
+        blocks of the fixed RDF file, whole entries each (the first with the
+        lines in front of the first entry), e.g. for parse_buffer
+    """
+
+    counter = 0
+    rest = b""
+    first = True
+    with open_bytes(rdf_file_in) as file_in:
+        blocks = iter(lambda: file_in.read(FIX_BLOCK_SIZE), b"")
+        for block in itertools.chain(blocks, [None]):
+            last = block is None
+            if last:
+                piece = rest.replace(b"\r", b"\n")
+            else:
+                buffer = rest + block
+                carried = b""
+                if buffer.find(b"\r") != -1:
+                    # as universal newlines; a \r at the end may belong to a \r\n
+                    if buffer.endswith(b"\r"):
+                        buffer, carried = buffer[:-1], b"\r"
+                    buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                cut = _entry_cut(buffer)
+                if cut == -1:
+                    rest = buffer + carried
+                    continue
+                piece, rest = buffer[:cut], buffer[cut:] + carried
+
+            if first:
+                first = False
+                seed_end = piece.find(b"\n") + 1
+                if seed_end == 0:
+                    # a single line without newline, a corner case of fixed_lines
+                    yield "".join(fixed_lines(rdf_file_in, numbered)).encode("utf-8")
+                    return None
+                # the first line is the "seed" of fixed_lines, see there
+                piece = piece[:seed_end] + piece
+
+            piece, counter = _fix_piece(piece, counter, last, numbered)
+            yield piece
+
+
+def parse_blocks(blocks: Iterable[bytes], rdf_type: str) -> Iterator[RdfRecord]:
+    """Parses blocks of whole entries (e.g. fixed_blocks()) as one file, see
+    parse_buffer.
+
+    Args:
+        blocks: the (fixed) RDF file in blocks, cut at the start of an entry
+        rdf_type: RdfSource value of the file (see detect_file_type)
+    Yields:
+        RdfRecord per $RFMT entry, in file order.
+    """
+    for block in blocks:
+        yield from parse_buffer(block, rdf_type)
+
+
+def scan_schema_blocks(blocks: Iterable[bytes], rdf_type: str) -> RdfSchema:
+    """scan_schema on the bytes level, for blocks of whole lines
+    (e.g. fixed_blocks()); only the lines looked at are decoded.
+
+    Args:
+        blocks: the (fixed) RDF file in blocks of whole lines
+        rdf_type: RdfSource value of the file (see detect_file_type)
+    Returns:
+        RdfSchema
+    """
+
+    def lines() -> Iterator[str]:
+        for block in blocks:
+            for match in PATTERN_SCHEMA_LINES.finditer(block):
+                line = match.group(0).decode("utf-8")
+                yield line if line.endswith("\n") else line + "\n"
+
+    return scan_schema(lines(), rdf_type)
+
+
+def parse_records(
+    lines: Iterable[str], rdf_type: Optional[str] = None
+) -> Iterator[RdfRecord]:
+    """Parses (fixed) RDF lines in one pass.
+
+    The source (Scifinder, Reaxys, etc.) belongs to the whole file, as rdf_origin
+    did before: pass it as rdf_type (see detect_file_type). Without it, it is
+    determined on the fly from the first line that gives it away, entries before
+    that line are then parsed as of unknown source.
+    The lines of an entry are collected and split as bytes (see parse_buffer).
+
+    Args:
+        lines: lines of a fixed RDF file, e.g. an open file or fixed_lines()
+        rdf_type: RdfSource value of the file (from detect_file_type or an index),
+            then no detection is done.
+    Yields:
+        RdfRecord per $RFMT entry, in file order.
+    """
+
+    record: Optional[RdfRecord] = None
+    record_lines: List[str] = []
+
+    for line in lines:
+        if line.startswith("$RFMT"):
+            if record is not None:
+                body = "".join(record_lines).encode("utf-8")
+                if rdf_type is None:
+                    rdf_type = detect_rdf_type(body)[0]
+                if rdf_type is None:
+                    rdf_type = rdf_origin_of_line(line)
+                _fill_record(record, body, rdf_type or RdfSource.UNKNOWN.value)
+                yield record
+            elif rdf_type is None:
+                rdf_type = rdf_origin_of_line(line)
+            record = RdfRecord(str(line.strip().split(" ")[2]))
+            record_lines = []
+            continue
+
+        if record is not None:
+            record_lines.append(line)
+        elif rdf_type is None:
+            rdf_type = rdf_origin_of_line(line)
+
+    if record is not None:
+        body = "".join(record_lines).encode("utf-8")
+        if rdf_type is None:
+            rdf_type = detect_rdf_type(body)[0]
+        _fill_record(record, body, rdf_type or RdfSource.UNKNOWN.value)
+        yield record
+
+
+def read_records(rdf_file: str) -> Iterator[RdfRecord]:
+    """Reads a (fixed) RDF file in one pass, see parse_records.
+
+    Uncompressed files are mapped into memory and parsed on the bytes level
+    (parse_buffer); compressed ones and those with \r\n line ends line by line.
+
+    Args:
+        rdf_file: RDF file with corrections (if any), can be compressed
+    Yields:
+        RdfRecord per $RFMT entry, in file order.
+    """
+
+    if strip_compression(rdf_file) == rdf_file:
+        with open(rdf_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\r") == -1:
+                    yield from parse_buffer(mm)
+                    return None
+
+    rdf_type = detect_file_type(rdf_file)
+    with open_text(rdf_file) as f:
+        yield from parse_records(f, rdf_type)
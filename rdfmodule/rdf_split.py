@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+Splitting of large RDF files into shards, for processing on several nodes
+(or processes), and joining of the per shard outputs in the original order.
+
+split_rdf cuts a file at $RFMT lines, into a number of parts or parts of a target
+size. Each shard starts with the header of the file ($RDFILE, $DATM), so it is
+a valid RDF file on its own (fix() takes it as any other file).
+The shards go to "<name>_parts", with a manifest ("<name>.split.json") that lists
+them in order, with their byte offset and length in the source and their entries.
+join_outputs puts the "_fixed.rdf" and table outputs of the shards together again;
+fix_in_parts does all three steps locally, the shards in parallel processes.
+
+Note: the joined "_fixed.rdf" is that of the whole file, but the joined tables have
+the layout of the chunked mode (fix() with chunk_size): each column name once,
+every row with the values of its own entry. The default csv of the whole file
+repeats the name of a repeated $DTYPE tag (e.g. SciFinder, Reaxys) instead, and a
+repeated reaction ID gets the last values in all its rows.
+Spresi entries without ID are numbered per file, i.e. per shard.
+
+Example:
+    from rdfmodule import rdf_split
+    manifest = rdf_split.split_rdf("huge.rdf", parts=64)  # huge_parts/
+    # ... rdf_fixer.fix() on each shard, anywhere ...
+    rdf_split.join_outputs(manifest)  # huge_fixed.rdf, huge.csv
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import csv
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from typing import IO, Dict, List, Optional
+
+from rdfmodule.arrow_output import FILE_EXTENSIONS
+from rdfmodule.long_output import long_file_names
+from rdfmodule.rdf_parser import open_bytes, open_text, strip_compression
+
+SPLIT_EXTENSION = ".split.json"
+# read in blocks of this size
+BLOCK_SIZE = 1 << 24
+
+
+def _stem(rdf_file: str) -> str:
+    """File name without directory, compression and rdf extension."""
+    return os.path.splitext(os.path.basename(strip_compression(rdf_file)))[0]
+
+
+def _parts_dir(rdf_file: str) -> str:
+    """Default directory of the shards, "<name>_parts" next to the file
+    (with the manifest in it, fix() on a directory above leaves it out)."""
+    return os.path.splitext(strip_compression(rdf_file))[0] + "_parts"
+
+
+def _content_size(rdf_file: str) -> int:
+    """Size of the (decompressed) content of a file."""
+    if strip_compression(rdf_file) == rdf_file:
+        return os.path.getsize(rdf_file)
+    size = 0
+    with open_bytes(rdf_file) as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            size += len(block)
+    return size
+
+
+def _number_of_entries(piece: bytes) -> int:
+    """$RFMT lines in a piece of a shard (starting at a line start)."""
+    return piece.count(b"\n$RFMT") + (piece[:5] == b"$RFMT")
+
+
+def split_rdf(
+    rdf_file: str,
+    parts: Optional[int] = None,
+    target_size: Optional[int] = None,
+    out_dir: Optional[str] = None,
+) -> str:
+    """Splits an RDF file at its $RFMT lines into shards with the file header each.
+
+    Args:
+        rdf_file: the (original or fixed) RDF file, can be compressed
+        parts: number of shards (of about the same size), or
+        target_size: size of the shards in bytes (a shard ends with the
+            entry that reaches it; the header is not counted)
+        out_dir: directory of the shards and the manifest,
+            default is "<name>_parts" next to rdf_file. It has to be new or empty,
+            outputs of an earlier split there would be joined with the new ones.
+    Returns:
+        name of the manifest file; the shards are "<name>_part0001.rdf" and so on.
+    """
+
+    if (parts is None) == (target_size is None):
+        raise ValueError("Give either the number of parts or the target size.")
+    if out_dir is None:
+        out_dir = _parts_dir(rdf_file)
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        raise ValueError(f"Directory for the shards is not empty: {out_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+    stem = _stem(rdf_file)
+    if parts is not None:
+        # ceiling, the last shard gets the rest
+        target_size = max(1, -(-_content_size(rdf_file) // parts))
+
+    shards: List[Dict] = []
+    header_parts: List[bytes] = []
+    header: Optional[bytes] = None
+    shard_out: Optional[IO] = None
+    offset = 0  # in the (decompressed) source, of what was written so far
+    rest = b""
+
+    def write_piece(piece: bytes) -> None:
+        nonlocal offset, shard_out
+        if shard_out is None:
+            name = f"{stem}_part{len(shards) + 1:04d}.rdf"
+            shard_out = open(os.path.join(out_dir, name), "wb")
+            shard_out.write(header)
+            shards.append({"file": name, "offset": offset, "length": 0, "entries": 0})
+        shard_out.write(piece)
+        shards[-1]["length"] += len(piece)
+        shards[-1]["entries"] += _number_of_entries(piece)
+        offset += len(piece)
+
+    def close_shard() -> None:
+        nonlocal shard_out
+        if shard_out is not None:
+            shard_out.close()
+            shard_out = None
+
+    try:
+        with open_bytes(rdf_file) as f:
+            blocks = itertools.chain(iter(lambda: f.read(BLOCK_SIZE), b""), [None])
+            for block in blocks:
+                if block is None:
+                    buffer, rest = rest, b""
+                else:
+                    # complete lines only; the last newline stays with the rest,
+                    # so an $RFMT line at the start of the next block is found too
+                    buffer = rest + block
+                    last_newline = buffer.rfind(b"\n")
+                    if last_newline <= 0:
+                        rest = buffer
+                        continue
+                    buffer, rest = buffer[:last_newline], buffer[last_newline:]
+
+                if header is None:
+                    if buffer[:5] == b"$RFMT":
+                        start = 0
+                    else:
+                        start = buffer.find(b"\n$RFMT") + 1
+                        if start == 0:
+                            header_parts.append(buffer)
+                            continue
+                    header = b"".join(header_parts) + buffer[:start]
+                    offset = len(header)
+                    buffer = buffer[start:]
+
+                while buffer:
+                    written = 0 if shard_out is None else shards[-1]["length"]
+                    room = target_size - written
+                    cut = -1
+                    if len(buffer) > room:
+                        cut = buffer.find(b"\n$RFMT", max(room - 1, 0))
+                    if cut == -1:
+                        write_piece(buffer)
+                        break
+                    write_piece(buffer[: cut + 1])
+                    close_shard()
+                    buffer = buffer[cut + 1 :]
+    finally:
+        close_shard()
+
+    manifest_file = os.path.join(out_dir, stem + SPLIT_EXTENSION)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": 1,
+                "source": os.path.abspath(rdf_file),
+                "header_length": 0 if header is None else len(header),
+                "shards": shards,
+            },
+            f,
+            indent=1,
+        )
+    print(f"Split {rdf_file} into {len(shards)} shard(s): ", manifest_file)
+
+    return manifest_file
+
+
+def read_manifest(manifest_file: str) -> Dict:
+    """The manifest of a split, with the shard file names as full paths."""
+    with open(manifest_file, encoding="utf-8") as f:
+        manifest = json.load(f)
+    shard_dir = os.path.dirname(os.path.abspath(manifest_file))
+    for shard in manifest["shards"]:
+        shard["file"] = os.path.join(shard_dir, shard["file"])
+    return manifest
+
+
+def _table_column_order(columns: List[str]) -> List[str]:
+    """Union columns: the Reagent and Product columns by number, then the others."""
+
+    def numbered(prefix: str) -> List[str]:
+        found = [
+            c for c in columns if c.startswith(prefix) and c[len(prefix) :].isdigit()
+        ]
+        return sorted(found, key=lambda c: int(c[len(prefix) :]))
+
+    molecules = numbered("Reagent") + numbered("Product")
+    return molecules + [c for c in columns if c not in molecules]
+
+
+def join_fixed(rdf_files: List[str], out_file: str) -> None:
+    """Concatenates (fixed) RDF shards, with the header of the first one only."""
+    with open_text(out_file, "w") as file_out:
+        for i, rdf_file in enumerate(rdf_files):
+            with open_text(rdf_file) as file_in:
+                lines = iter(file_in)
+                if i > 0:
+                    lines = itertools.dropwhile(
+                        lambda line: not line.startswith("$RFMT"), lines
+                    )
+                file_out.writelines(lines)
+
+
+def join_csv(csv_files: List[str], out_file: str) -> None:
+    """
+    Concatenates tab separated tables (as written by fix) into one, over the union
+    of their columns after the first (the reaction ID); rows are streamed,
+    the files can have other columns each.
+    A column name repeated within a file (default csv of fix) is taken once,
+    its values are the same: the result has the layout of the chunked csv.
+    """
+    first_column = ""
+    columns: Dict[str, None] = {}
+    for csv_file in csv_files:
+        with open_text(csv_file, newline="") as f:
+            header = next(csv.reader(f, delimiter="\t"))
+        first_column = header[0]
+        columns.update(dict.fromkeys(header[1:]))
+    columns_out = _table_column_order(list(columns))
+
+    with open_text(out_file, "w", newline="") as file_out:
+        writer = csv.writer(file_out, delimiter="\t", lineterminator="\n")
+        writer.writerow([first_column] + columns_out)
+        for csv_file in csv_files:
+            with open_text(csv_file, newline="") as f:
+                reader = csv.reader(f, delimiter="\t")
+                header = next(reader)
+                position = {}
+                for i, column in enumerate(header[1:], start=1):
+                    position.setdefault(column, i)
+                picks = [position.get(column) for column in columns_out]
+                for row in reader:
+                    writer.writerow(
+                        [row[0]] + ["" if i is None else row[i] for i in picks]
+                    )
+
+
+def join_arrow(table_files: List[str], out_file: str, output_format: str) -> None:
+    """Concatenates Parquet or Feather files (as written by fix) into one,
+    over the union of their columns; one file in memory at a time."""
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    def read(table_file: str) -> "pa.Table":
+        if output_format == "parquet":
+            return pyarrow.parquet.read_table(table_file)
+        with pa.memory_map(table_file) as source:
+            return pyarrow.ipc.open_file(source).read_all()
+
+    fields: Dict[str, "pa.Field"] = {}
+    for table_file in table_files:
+        if output_format == "parquet":
+            schema = pyarrow.parquet.read_schema(table_file)
+        else:
+            with pa.memory_map(table_file) as source:
+                schema = pyarrow.ipc.open_file(source).schema
+        for field in schema:
+            fields.setdefault(field.name, field)
+    # the numeric (float) columns stay at the end, as in ArrowTableWriter
+    names = [name for name in fields if pa.types.is_string(fields[name].type)]
+    numeric = [name for name in fields if name not in names]
+    names.remove("rxn_id")
+    schema = pa.schema(
+        [fields["rxn_id"]]
+        + [fields[name] for name in _table_column_order(names) + numeric]
+    )
+
+    if output_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(out_file, schema)
+    else:
+        writer = pyarrow.ipc.new_file(out_file, schema)
+    try:
+        for table_file in table_files:
+            table = read(table_file)
+            arrays = [
+                (
+                    table.column(field.name)
+                    if field.name in table.column_names
+                    else pa.nulls(len(table), field.type)
+                )
+                for field in schema
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        writer.close()
+
+
+def join_outputs(
+    manifest_file: str,
+    out_dir: Optional[str] = None,
+    output_format: str = "csv",
+    compress_output: Optional[str] = None,
+) -> List[str]:
+    """Joins the outputs of fix() on the shards of a split, in the original order.
+
+    The "_fixed.rdf" files are joined if all shards have one, the same for the
+    tables (csv, Parquet or Feather as output_format). The joined files get the
+    names fix() would give them for the source file; the tables have the layout of
+    the chunked mode, each column name once (see the module docstring).
+
+    Args:
+        manifest_file: the manifest of split_rdf
+        out_dir: directory of the joined files, default the one of the source file
+        output_format: format of the tables, "csv", "parquet", "feather" or "long"
+        compress_output: the compression (extension) fix() was called with, if any
+    Returns:
+        names of the joined files.
+    """
+
+    manifest = read_manifest(manifest_file)
+    source = manifest["source"]
+    if out_dir is None:
+        out_dir = os.path.dirname(source)
+    extension = "." + compress_output if compress_output else ""
+    shard_bases = [os.path.splitext(shard["file"])[0] for shard in manifest["shards"]]
+    out_base = os.path.join(out_dir, _stem(source))
+
+    joined = []
+    fixed_files = [base + "_fixed.rdf" + extension for base in shard_bases]
+    if fixed_files and all(os.path.isfile(f) for f in fixed_files):
+        joined.append(out_base + "_fixed.rdf" + extension)
+        join_fixed(fixed_files, joined[-1])
+
+    table_extension = FILE_EXTENSIONS[output_format]
+    if output_format in ("csv", "long"):
+        table_extension += extension
+    # (files of the shards, joined file) per table, the long layout has three
+    tables = [
+        ([base + table_extension for base in shard_bases], out_base + table_extension)
+    ]
+    if output_format == "long":
+        shard_names = [long_file_names(base + table_extension) for base in shard_bases]
+        out_names = long_file_names(out_base + table_extension)
+        tables = [
+            ([names[t] for names in shard_names], out_names[t]) for t in out_names
+        ]
+    for table_files, out_file in tables:
+        if not table_files or not all(os.path.isfile(f) for f in table_files):
+            continue
+        joined.append(out_file)
+        if output_format in ("csv", "long"):
+            join_csv(table_files, out_file)
+        elif output_format in ("parquet", "feather"):
+            join_arrow(table_files, out_file, output_format)
+        else:
+            raise ValueError(f"Tables of format {output_format} can't be joined.")
+    for joined_file in joined:
+        print("Joined: ", joined_file)
+
+    return joined
+
+
+def fix_in_parts(rdf_file: str, parts: int, workers: Optional[int] = None, **options):
+    """fix() for a single large file, in parallel processes on shards of it.
+
+    The file is split into parts shards, in a new "<name>_parts_..." directory
+    next to it (so only these shards are processed and joined, never the outputs
+    of an earlier run), fix() processes them with workers processes (default: parts),
+    the outputs are joined under the names fix() would use for rdf_file
+    (the tables in the layout of the chunked mode, see join_outputs),
+    and the shards are removed again (kept if one failed).
+
+    Args:
+        rdf_file: the RDF file
+        parts: number of shards
+        workers: number of processes, default is parts
+        options: further arguments of fix(), e.g. output_format, chunk_size.
+            With output_format "sqlite", a shared database is needed.
+    Returns:
+        the FixSummary of the shards.
+    """
+    from rdfmodule import rdf_fixer
+
+    if not os.path.isfile(rdf_file):
+        raise ValueError(f"Only a single file can be processed in parts: {rdf_file}")
+    output_format = options.get("output_format", "csv")
+    if output_format == "sqlite" and options.get("database") is None:
+        raise ValueError("sqlite output in parts needs one database (database=).")
+    work_dir = tempfile.mkdtemp(
+        prefix=os.path.basename(_parts_dir(rdf_file)) + "_",
+        dir=os.path.dirname(os.path.abspath(rdf_file)),
+    )
+    manifest_file = split_rdf(rdf_file, parts=parts, out_dir=work_dir)
+    summary = rdf_fixer.fix(work_dir, workers=workers or parts, **options)
+    if summary.failed:
+        print("Shards kept for inspection: ", work_dir)
+        return summary
+
+    join_outputs(
+        manifest_file,
+        output_format="csv" if output_format == "sqlite" else output_format,
+        compress_output=options.get("compress_output"),
+    )
+    shutil.rmtree(work_dir)
+    return summary
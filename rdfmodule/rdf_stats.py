@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Quick statistics of RDF files, without converting them:
+number of reactions, empty molecule blocks fix() would delete,
+max number of reagents/products (the Reagent/Product columns of the table),
+the source as detected by the parser, and the distinct $DTYPE tags (the columns).
+Works on the bytes of the original files (mmap, or blockwise if compressed),
+neither RDKit nor pandas are imported.
+
+Usage:
+from rdfmodule import rdf_stats
+for stats in rdf_stats.scan("directory name", workers=8):
+    print(stats.to_json())
+or from the command line: rdf-fixer directory --stats
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import json
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from rdfmodule.rdf_fixer import files_to_read
+from rdfmodule.rdf_parser import (
+    PATTERN_RXN_COUNTS_BYTES,
+    RdfSource,
+    detect_rdf_vendor,
+    open_bytes,
+    strip_compression,
+)
+
+# rest of a $DTYPE line (after a newline)
+PATTERN_DTYPE_REST = re.compile(rb"\n\$DTYPE([^\n]*)")
+# compressed files are scanned in blocks of about this size
+BLOCK_SIZE = 1 << 26
+
+
+class RdfStats:
+    """
+    Statistics of one RDF file.
+    entries: $RFMT entries in the file, reactions: those left after fixing
+    (entries without molecule block are deleted, see empty_molblocks).
+    tags: distinct $DTYPE tags without the source prefix, in order of appearance.
+    error is the error text if the file couldn't be scanned.
+    """
+
+    def __init__(self, rdf_file: str):
+        self.rdf_file = rdf_file
+        self.source = RdfSource.UNKNOWN.name
+        self.rdf_type = RdfSource.UNKNOWN.value
+        self.bytes_read = 0
+        self.entries = 0
+        self.empty_molblocks = 0
+        self.max_reagents = 0
+        self.max_products = 0
+        self.tags: List[str] = []
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+    def __str__(self):
+        return (
+            f"{self.rdf_file}: {self.source}, {self.reactions} reactions "
+            f"({self.empty_molblocks} empty deleted), max {self.max_reagents} reagents, "
+            f"{self.max_products} products, {len(self.tags)} tags"
+        )
+
+    @property
+    def reactions(self) -> int:
+        return self.entries - self.empty_molblocks
+
+    def as_dict(self) -> dict:
+        return {
+            "file": self.rdf_file,
+            "source": self.source,
+            "rdf_type": self.rdf_type,
+            "reactions": self.reactions,
+            "entries": self.entries,
+            "empty_molblocks": self.empty_molblocks,
+            "max_reagents": self.max_reagents,
+            "max_products": self.max_products,
+            "tags": self.tags,
+            "bytes_read": self.bytes_read,
+            "seconds": round(self.seconds, 6),
+            "error": self.error,
+        }
+
+    def to_json(self) -> str:
+        """One line of JSON."""
+        return json.dumps(self.as_dict())
+
+
+def _blocks(rdf_file: str) -> Iterator[bytes]:
+    """
+    The content of a file in blocks that end where an $RFMT line starts,
+    with "\\n" line ends. Uncompressed files (with "\\n" line ends) are one mmap block.
+    """
+    if strip_compression(rdf_file) == rdf_file:
+        with open(rdf_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\r") == -1:
+                    yield mm
+                    return None
+
+    rest = b""
+    with open_bytes(rdf_file) as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            buffer = rest + block
+            # a "\r\n" could be cut in two, the "\r" waits for the next block
+            held = b"\r" if buffer.endswith(b"\r") else b""
+            buffer = buffer[: len(buffer) - len(held)]
+            if b"\r" in buffer:
+                buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            cut = buffer.rfind(b"\n$RFMT")
+            if cut == -1:
+                rest = buffer + held
+                continue
+            yield buffer[: cut + 1]
+            rest = buffer[cut + 1 :] + held
+    if rest:
+        yield rest.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+
+def _line_starts(buffer: bytes, marker: bytes) -> Iterator[int]:
+    """Offsets of all lines starting with marker (buffer can be an mmap)."""
+    if buffer[: len(marker)] == marker:
+        yield 0
+    position = buffer.find(b"\n" + marker)
+    while position != -1:
+        yield position + 1
+        position = buffer.find(b"\n" + marker, position + 1)
+
+
+def _scan_block(buffer: bytes, stats: RdfStats, dtype_lines: Dict[bytes, None]):
+    """Adds the counts of one block; the rest of the $DTYPE lines go to dtype_lines."""
+    stats.bytes_read += len(buffer)
+    if stats.source == RdfSource.UNKNOWN.name:
+        # by name: the value of INFOCHEM is that of SCIFINDER
+        vendor = detect_rdf_vendor(buffer)[0]
+        if vendor is not None:
+            stats.rdf_type = RdfSource[vendor].value
+            stats.source = vendor
+
+    for start in _line_starts(buffer, b"$RFMT"):
+        stats.entries += 1
+        # $RFMT directly followed by $DTYPE: no molecule block (deleted by fix)
+        line_end = buffer.find(b"\n", start)
+        if line_end != -1 and buffer[line_end + 1 : line_end + 7] == b"$DTYPE":
+            stats.empty_molblocks += 1
+
+    # the "  y  z" lines between $RXN and the next $MOL line
+    end = 0
+    for start in _line_starts(buffer, b"$RXN"):
+        if start < end:
+            continue
+        end = buffer.find(b"\n$MOL\n", start)
+        end = len(buffer) if end == -1 else end + 1
+        for counts in PATTERN_RXN_COUNTS_BYTES.finditer(buffer, start, end):
+            stats.max_reagents = max(stats.max_reagents, int(counts.group(1)))
+            stats.max_products = max(stats.max_products, int(counts.group(2)))
+
+    if buffer[:6] == b"$DTYPE":
+        dtype_lines[buffer[6 : buffer.find(b"\n")]] = None
+    dtype_lines.update(dict.fromkeys(PATTERN_DTYPE_REST.findall(buffer)))
+
+
+def scan_file(rdf_file: str) -> RdfStats:
+    """Statistics of one (original) RDF file, can be compressed."""
+    stats = RdfStats(rdf_file)
+    start = time.perf_counter()
+    dtype_lines: Dict[bytes, None] = {}
+    for buffer in _blocks(rdf_file):
+        _scan_block(buffer, stats, dtype_lines)
+
+    # column names as in the table (see rdf_parser.scan_schema), after the fixing
+    tags: Dict[str, None] = {}
+    for rest in dtype_lines:
+        line = ("$DTYPE" + rest.decode("utf-8")).replace("rxn:", "RXN:")
+        tags[line.strip().split(" ")[1].replace(stats.rdf_type, "")] = None
+    stats.tags = list(tags)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _scan_file_job(rdf_file: str) -> RdfStats:
+    """scan_file, also in a worker process; a failure is kept in RdfStats.error."""
+    try:
+        return scan_file(rdf_file)
+    except Exception as _e:
+        stats = RdfStats(rdf_file)
+        stats.error = f"{type(_e).__name__}: {_e}"
+        return stats
+
+
+def scan(rdf_source: str, workers: int = 1) -> List[RdfStats]:
+    """Statistics of an RDF file, or of all RDF files of a directory (recursively).
+
+    "_fixed.rdf" files are left out, as in fix().
+
+    Args:
+        rdf_source: filename, alt. directory and subdirectories to scan
+        workers: number of processes, files are then scanned in parallel.
+    Returns:
+        RdfStats per file, in file order.
+    """
+    rdf_files = files_to_read(rdf_source, skip_fixed=False).rdf_source
+    if workers > 1 and len(rdf_files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_scan_file_job, rdf_files))
+
+    return [_scan_file_job(rdf_file) for rdf_file in rdf_files]
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Reactions of RDF files as Python objects, streamed (no intermediate files).
+The fixing rules of fix() are applied on the fly (see rdf_parser.fixed_blocks):
+entries without molecule block are left out, "rxn:" becomes "RXN:",
+bare $RFMT lines (Spresi) are numbered.
+
+Example:
+    from rdfmodule.reactions import read_reactions
+    for reaction in read_reactions("directory name", smiles=True):
+        print(reaction.rxn_id, reaction.reagent_smiles, reaction.fields)
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import itertools
+import os
+from typing import Dict, Iterator, List, Optional
+
+from rdfmodule.rdf_fixer import (
+    SMILES_CHUNK_SIZE,
+    files_to_read,
+    smiles_in_chunks,
+    smiles_pool,
+)
+from rdfmodule.rdf_parser import (
+    RdfRecord,
+    detect_file_type,
+    fixed_blocks,
+    parse_blocks,
+)
+from rdfmodule.smiles_cache import get_smiles_cache
+
+
+class Reaction:
+    """
+    One reaction of an RDF file.
+    reagents, products: molblocks (empty molblocks left out).
+    reagent_smiles, product_smiles: SMILES of these, same order
+        (None for a molecule RDKit can't read); None if not requested.
+    fields: column -> value, as in the csv (multiline values resolved).
+    source_file: the RDF file it comes from.
+    """
+
+    def __init__(self, record: RdfRecord, source_file: str):
+        self.rxn_id = record.rxn_id
+        self.source_file = source_file
+        reagents = record.molecules[: record.number_reagents]
+        products = record.molecules[record.number_reagents :]
+        self.reagents: List[str] = [mol for mol in reagents if mol != ""]
+        self.products: List[str] = [mol for mol in products if mol != ""]
+        self.reagent_smiles: Optional[List[Optional[str]]] = None
+        self.product_smiles: Optional[List[Optional[str]]] = None
+        self.fields: Dict[str, str] = record.fields
+
+    def __repr__(self):
+        return (
+            f"Reaction({self.rxn_id!r}, {len(self.reagents)} reagents, "
+            f"{len(self.products)} products, {len(self.fields)} fields)"
+        )
+
+
+def read_reactions(
+    rdf_source: str,
+    smiles=False,
+    smiles_profile: str = "full",
+    smiles_workers: int = 1,
+    cache_size: int = 0,
+    batch_size: int = SMILES_CHUNK_SIZE,
+) -> Iterator[Reaction]:
+    """Reactions of an RDF file, or of all RDF files of a directory (recursively).
+
+    Lazy: files are read one after the other, line by line; with smiles,
+    batch_size reactions at a time are held for the SMILES generation.
+    In directories, "_fixed.rdf" files are left out (their originals are read).
+
+    Args:
+        rdf_source: filename (original or fixed, can be compressed), alt. directory
+        smiles: default False. If True, the SMILES are generated (needs RDKit).
+        smiles_profile: "full" (default), "sanitize" or "raw", see molecules.py.
+        smiles_workers: processes for the SMILES generation, default 1.
+        cache_size: number of SMILES kept in memory (LRU), default 0 (off).
+        batch_size: reactions per batch for the SMILES generation.
+    Yields:
+        Reaction, in file order.
+    """
+
+    if os.path.isfile(rdf_source):
+        rdf_files = [rdf_source]
+    else:
+        rdf_files = files_to_read(rdf_source, skip_fixed=False).rdf_source
+    smiles_cache = None
+    if smiles and cache_size > 0:
+        smiles_cache = get_smiles_cache(cache_size, profile=smiles_profile)
+
+    # one process pool for all batches and files
+    with smiles_pool(smiles_workers if smiles else 1) as pool:
+        for rdf_file in rdf_files:
+            reactions = (
+                Reaction(record, rdf_file)
+                for record in parse_blocks(
+                    fixed_blocks(rdf_file), detect_file_type(rdf_file)
+                )
+            )
+            if not smiles:
+                yield from reactions
+                continue
+
+            while True:
+                batch = list(itertools.islice(reactions, batch_size))
+                if not batch:
+                    break
+                all_smiles = iter(
+                    smiles_in_chunks(
+                        [
+                            mol
+                            for reaction in batch
+                            for mol in reaction.reagents + reaction.products
+                        ],
+                        smiles_workers,
+                        smiles_cache=smiles_cache,
+                        profile=smiles_profile,
+                        pool=pool,
+                    )
+                )
+                for reaction in batch:
+                    reaction.reagent_smiles = [
+                        next(all_smiles) for _ in reaction.reagents
+                    ]
+                    reaction.product_smiles = [
+                        next(all_smiles) for _ in reaction.products
+                    ]
+                    yield reaction
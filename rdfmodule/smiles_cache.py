@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed cache for molblock -> SMILES results.
+Reagents, solvents and common products repeat a lot, within and across exports.
+Keyed by a hash of the normalized molblock (header lines with names/timestamps ignored),
+kept in an in-memory LRU and optionally in a SQLite file for re-runs.
+The SMILES profile (see molecules.py) is part of the key, other than "full"
+(so existing cache files stay valid).
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class SmilesCache:
+    """
+    LRU cache of SMILES per molblock, optionally backed by a SQLite file.
+    hits/misses count every lookup; a None result (molecule couldn't be read) is cached too.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        db_file: Optional[str] = None,
+        profile: str = "full",
+    ):
+        self.max_size = max_size
+        self.db_file = db_file
+        self.profile = profile
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._unsaved: Dict[str, Optional[str]] = {}
+        self._db = None
+        if db_file is not None:
+            self._db = sqlite3.connect(db_file, timeout=60)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS smiles (key TEXT PRIMARY KEY, smiles TEXT)"
+            )
+            self._db.commit()
+
+    def __str__(self):
+        return f"SMILES cache: {self.hits} hits, {self.misses} misses"
+
+    def key(self, mol_string: str) -> str:
+        """
+        Hash of the molblock without its name, program/timestamp and comment lines.
+        The 2D/3D flag of the program line is kept, it matters for stereo perception.
+        """
+        lines = mol_string.split("\n")
+        dimension = lines[1][20:22] if len(lines) > 1 else ""
+        body = "\n".join(line.rstrip() for line in lines[3:])
+        if self.profile != "full":
+            body = self.profile + "\n" + body
+        return hashlib.sha1((dimension + "\n" + body).encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns:
+            (found, smiles); smiles can be None also when found (failed molecule).
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return True, self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT smiles FROM smiles WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row[0])
+                self.hits += 1
+                return True, row[0]
+
+        self.misses += 1
+        return False, None
+
+    def store(self, key: str, smiles: Optional[str]) -> None:
+        self._remember(key, smiles)
+        if self._db is not None:
+            self._unsaved[key] = smiles
+
+    def flush(self) -> None:
+        """Writes new entries to the SQLite file (if any), in one transaction."""
+        if self._db is None or not self._unsaved:
+            return None
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO smiles (key, smiles) VALUES (?, ?)",
+                list(self._unsaved.items()),
+            )
+        self._unsaved = {}
+
+    def close(self) -> None:
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, smiles: Optional[str]) -> None:
+        self._memory[key] = smiles
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+
+_process_caches: Dict[Tuple[int, Optional[str], str], SmilesCache] = {}
+
+
+def get_smiles_cache(
+    max_size: int, db_file: Optional[str] = None, profile: str = "full"
+) -> SmilesCache:
+    """
+    One cache per process and configuration, so it lives on from file to file
+    (also within worker processes, which build their own).
+    """
+    config = (max_size, db_file, profile)
+    if config not in _process_caches:
+        _process_caches[config] = SmilesCache(max_size, db_file, profile)
+
+    return _process_caches[config]
+
+
+def split_by_cache(
+    cache: SmilesCache, mol_strings: List[str]
+) -> Tuple[List[Optional[str]], "OrderedDict[str, List[int]]", List[str]]:
+    """
+    Looks up all molblocks. Repeats of a molblock missing from the cache are
+    only converted once (and count as hits).
+
+    Returns:
+        results: SMILES per position, filled where found
+        pending: key -> positions still to fill, in order of to_convert
+        to_convert: one molblock per pending key
+    """
+    results: List[Optional[str]] = [None] * len(mol_strings)
+    pending: "OrderedDict[str, List[int]]" = OrderedDict()
+    to_convert: List[str] = []
+    for i, mol_string in enumerate(mol_strings):
+        key = cache.key(mol_string)
+        if key in pending:
+            pending[key].append(i)
+            cache.hits += 1
+            continue
+        found, smiles = cache.lookup(key)
+        if found:
+            results[i] = smiles
+        else:
+            pending[key] = [i]
+            to_convert.append(mol_string)
+
+    return results, pending, to_convert
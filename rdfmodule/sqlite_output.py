@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite output of the converted reactions, in a normalized schema
+(the same tables whatever the source or its $DTYPE tags):
+
+    sources:   source_id, file (the RDF file), loaded (start of the last load),
+               complete (end of that load; NULL while loading or if it failed)
+    reactions: source_id, rxn_id (the $RIREG ID), number_reagents, number_products
+    molecules: source_id, rxn_id, role ("reagent" or "product"),
+               position (within the role),
+               smiles (NULL if RDKit couldn't read the molecule)
+    fields:    source_id, rxn_id, field (the column name of the csv), value
+
+A reaction is keyed by (source_id, rxn_id): the IDs of different files don't
+touch each other, also not the numbers fix() gives to entries without ID (Spresi).
+Indexed on the reaction and the SMILES. A database can take any number of files,
+also over several runs: a file loaded again replaces all reactions it brought
+in before, once its first batch is converted (a failing conversion before that
+leaves the earlier load as it is). A reaction ID repeated within a file keeps its last entry
+(as in the csv), the number of such replacements is printed.
+
+Example:
+    import sqlite3
+    db = sqlite3.connect("reactions.sqlite")
+    db.execute(
+        "SELECT file, rxn_id FROM molecules JOIN sources USING (source_id) "
+        "WHERE role = 'product' AND smiles = ?", (smiles,)
+    )
+
+@author: Alexander Minidis (DocMinus)
+
+license: MIT License
+Copyright (c) 2021-2024 DocMinus
+"""
+
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+from rdfmodule.long_output import long_rows
+from rdfmodule.rdf_parser import RdfRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source_id INTEGER PRIMARY KEY,
+    file TEXT UNIQUE NOT NULL,
+    loaded TEXT,
+    complete TEXT
+);
+CREATE TABLE IF NOT EXISTS reactions (
+    source_id INTEGER NOT NULL REFERENCES sources (source_id),
+    rxn_id TEXT NOT NULL,
+    number_reagents INTEGER,
+    number_products INTEGER,
+    PRIMARY KEY (source_id, rxn_id)
+);
+CREATE TABLE IF NOT EXISTS molecules (
+    source_id INTEGER NOT NULL,
+    rxn_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    smiles TEXT
+);
+CREATE TABLE IF NOT EXISTS fields (
+    source_id INTEGER NOT NULL,
+    rxn_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS molecules_reaction ON molecules (source_id, rxn_id);
+CREATE INDEX IF NOT EXISTS molecules_smiles ON molecules (smiles);
+CREATE INDEX IF NOT EXISTS fields_reaction ON fields (source_id, rxn_id);
+"""
+
+
+class SqliteWriter:
+    """
+    Loads the reactions of one RDF file into a SQLite database, batch by batch.
+    Each batch is one transaction; several processes can load into the same
+    database (they wait for each other's transactions). The earlier reactions of
+    the file are replaced with the first batch, finish() marks the load complete.
+    replaced counts the entries of a repeated reaction ID that were overwritten.
+    """
+
+    def __init__(self, db_file: str, source_file: str):
+        self.db_file = db_file
+        self.replaced = 0
+        self._rxn_ids = set()  # loaded so far from this file
+        self._db = sqlite3.connect(db_file, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(molecules)")]
+        if columns and "source_id" not in columns:
+            self._db.close()
+            raise ValueError(
+                f"{db_file} has the older schema (reactions keyed by rxn_id only), "
+                "load into a new database."
+            )
+        self._db.executescript(SCHEMA)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(sources)")]
+        if "complete" not in columns:
+            self._db.execute("ALTER TABLE sources ADD COLUMN complete TEXT")
+
+        self.source = os.path.abspath(source_file)
+        with self._db:
+            row = self._db.execute(
+                "SELECT source_id FROM sources WHERE file = ?", (self.source,)
+            ).fetchone()
+            if row is not None:
+                self.source_id = row[0]
+            else:
+                self.source_id = self._db.execute(
+                    "INSERT INTO sources (file) VALUES (?)", (self.source,)
+                ).lastrowid
+        # a file loaded again replaces what it brought in before,
+        # with the first batch (in its transaction)
+        self._started = False
+
+    def _start(self) -> None:
+        """Removes the earlier load of the file, within the current transaction."""
+        for table in ("reactions", "molecules", "fields"):
+            self._db.execute(
+                f"DELETE FROM {table} WHERE source_id = ?", (self.source_id,)
+            )
+        self._db.execute(
+            "UPDATE sources SET loaded = ?, complete = NULL WHERE source_id = ?",
+            (time.strftime("%Y-%m-%d %H:%M:%S"), self.source_id),
+        )
+        self._started = True
+
+    def write(self, records: List[RdfRecord], all_smiles: List[Optional[str]]) -> None:
+        """Writes one batch of reactions in one transaction.
+
+        Args:
+            records: parsed entries
+            all_smiles: the SMILES of all molecules of the records, in order
+                (see rdf_fixer.smiles_in_chunks)
+        """
+        # a repeated ID (within the batch, or loaded before from this file)
+        # keeps the last entry
+        latest = {}
+        smiles_of_molecules = iter(all_smiles)
+        for record in records:
+            smiles = [next(smiles_of_molecules) for _ in record.molecules]
+            if record.rxn_id in latest or record.rxn_id in self._rxn_ids:
+                self.replaced += 1
+            latest[record.rxn_id] = (record, smiles)
+        earlier = [
+            (self.source_id, rxn_id) for rxn_id in latest if rxn_id in self._rxn_ids
+        ]
+        self._rxn_ids.update(latest)
+
+        # the rows of the long layout, each with the source in front
+        tables = long_rows(
+            [record for record, _ in latest.values()],
+            [mol_smiles for _, smiles in latest.values() for mol_smiles in smiles],
+        )
+        reactions, molecules, fields = (
+            [(self.source_id,) + row for row in rows] for rows in tables
+        )
+
+        with self._db:
+            if not self._started:
+                self._start()
+            for table in ("reactions", "molecules", "fields"):
+                self._db.executemany(
+                    f"DELETE FROM {table} WHERE source_id = ? AND rxn_id = ?", earlier
+                )
+            self._db.executemany("INSERT INTO reactions VALUES (?, ?, ?, ?)", reactions)
+            self._db.executemany(
+                "INSERT INTO molecules VALUES (?, ?, ?, ?, ?)", molecules
+            )
+            self._db.executemany("INSERT INTO fields VALUES (?, ?, ?, ?)", fields)
+
+    def finish(self) -> None:
+        """Marks the load of the file complete, after its last batch
+        (for a file without reactions, its earlier load is removed here)."""
+        with self._db:
+            if not self._started:
+                self._start()
+            self._db.execute(
+                "UPDATE sources SET complete = ? WHERE source_id = ?",
+                (time.strftime("%Y-%m-%d %H:%M:%S"), self.source_id),
+            )
+
+    def close(self) -> None:
+        self._db.close()
+        if self.replaced:
+            print(
+                f"{self.source}: {self.replaced} entries of repeated reaction IDs "
+                "replaced by a later entry."
+            )
@@ -21,4 +21,11 @@ setup(
         "pandas",
         "numpy",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "zstd": ["zstandard"],
+    },
+    entry_points={
+        "console_scripts": ["rdf-fixer = rdfmodule.cli:main"],
+    },
 )